@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+from time import perf_counter
+import httpx
+import ollama
+from llama_3_1_1B import MODEL, KEEP_ALIVE
+
+MAX_CONCURRENCY = 4
+TIMEOUT = 60
+
+class Async_ollama_translator:
+    def __init__(self, model=MODEL, host=None, max_concurrency=MAX_CONCURRENCY, keep_alive=KEEP_ALIVE, timeout=TIMEOUT):
+        self.model = model
+        self.keep_alive = keep_alive
+        # One persistent client, its connection pool is sized to the number of concurrent requests
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        self.client = ollama.AsyncClient(host=host, limits=limits, timeout=timeout)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    def get_messages(self, text):
+        return [
+            {
+                'role': 'user',
+                'content': text,
+            },
+        ]
+
+    async def translate(self, text):
+        async with self.semaphore:
+            response = await self.client.chat(model=self.model, messages=self.get_messages(text), keep_alive=self.keep_alive)
+        return response['message']['content']
+
+    async def translate_stream(self, text):
+        # Yield the translation as Ollama streams it
+        async with self.semaphore:
+            stream = await self.client.chat(model=self.model, messages=self.get_messages(text), keep_alive=self.keep_alive, stream=True)
+            async for chunk in stream:
+                content = chunk['message']['content']
+                if content:
+                    yield content
+
+    async def translate_batch(self, texts):
+        return await asyncio.gather(*(self.translate(text) for text in texts))
+
+    async def close(self):
+        await self.client._client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+async def measure(host, model, num_requests, max_concurrency, stream):
+    # Send num_requests translations at once and report the latency of each one
+    async def timed_translate(translator, text):
+        start = perf_counter()
+        if stream:
+            first_token = None
+            async for _ in translator.translate_stream(text):
+                if first_token is None:
+                    first_token = perf_counter() - start
+        else:
+            await translator.translate(text)
+            first_token = None
+        return perf_counter() - start, first_token
+
+    async with Async_ollama_translator(model=model, host=host, max_concurrency=max_concurrency) as translator:
+        start = perf_counter()
+        results = await asyncio.gather(*(timed_translate(translator, f"Sentence number {i} to translate") for i in range(num_requests)))
+        total = perf_counter() - start
+    latencies = sorted(latency for latency, _ in results)
+    print(f"Requests: {num_requests}, concurrency: {max_concurrency}, total: {total:.3f}s")
+    print(f"Latency min: {latencies[0]:.3f}s, median: {latencies[len(latencies) // 2]:.3f}s, max: {latencies[-1]:.3f}s")
+    if stream:
+        first_tokens = sorted(first_token for _, first_token in results if first_token is not None)
+        if first_tokens:
+            print(f"Time to first token median: {first_tokens[len(first_tokens) // 2]:.3f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure latency and concurrency of the Ollama translator")
+    parser.add_argument("--host", default=None, help="Ollama host, e.g. http://127.0.0.1:11435 for fake_ollama_server.py")
+    parser.add_argument("--model", default=MODEL)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--stream", action="store_true")
+    args = parser.parse_args()
+    asyncio.run(measure(args.host, args.model, args.requests, args.concurrency, args.stream))
+
+if __name__ == "__main__":
+    main()
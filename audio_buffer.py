@@ -0,0 +1,47 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+MAX_WINDOW_SECONDS = 30 # Whisper works on windows of 30 seconds
+
+class Audio_ring_buffer:
+    def __init__(self, max_window_seconds=MAX_WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+        self.sample_rate = sample_rate
+        self.capacity = int(max_window_seconds * sample_rate)
+        # Every sample is written twice, at i and i + capacity, so the last samples are always
+        # a contiguous slice and Whisper can get a view without copying
+        self.buffer = np.zeros(2 * self.capacity, dtype=np.float32)
+        self.position = 0
+        self.length = 0
+
+    def write(self, data):
+        # Convert int16 frames straight into the preallocated float32 buffer
+        frames = np.frombuffer(data, dtype=np.int16)
+        if len(frames) > self.capacity:
+            frames = frames[-self.capacity:]
+        start = self.position
+        end = start + len(frames)
+        if end <= self.capacity:
+            self._write_at(frames, start)
+        else:
+            split = self.capacity - start
+            self._write_at(frames[:split], start)
+            self._write_at(frames[split:], 0)
+        self.position = end % self.capacity
+        self.length = min(self.length + len(frames), self.capacity)
+
+    def _write_at(self, frames, start):
+        end = start + len(frames)
+        np.multiply(frames, 1 / 32768.0, out=self.buffer[start:end], casting="unsafe")
+        self.buffer[start + self.capacity:end + self.capacity] = self.buffer[start:end]
+
+    def view(self):
+        # Last samples in chronological order, limited to the maximum window
+        end = self.position + self.capacity
+        return self.buffer[end - self.length:end]
+
+    def duration(self):
+        return self.length / self.sample_rate
+
+    def clear(self):
+        self.position = 0
+        self.length = 0
@@ -0,0 +1,179 @@
+import json
+import subprocess
+import threading
+import warnings
+
+SINKS = "sinks"
+SOURCES = "sources"
+# pactl prints section names in the language of the system
+SECTION_NAMES = {
+    "properties": "properties", "propiedades": "properties",
+    "ports": "ports", "puertos": "ports",
+    "formats": "formats", "formatos": "formats",
+}
+
+def parse_pactl_list(output):
+    # Single pass over the output of `pactl list sinks|sources`:
+    # devices start at column 0, their fields are indented one level and section contents two levels
+    devices = []
+    device = None
+    section = None
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        if not line[0].isspace():
+            if "#" in line:
+                device = {"id": line.split("#", 1)[1].strip()}
+                devices.append(device)
+                section = None
+            continue
+        if device is None:
+            continue
+        stripped = line.strip()
+        if line.startswith("\t\t"):
+            if section == "properties":
+                key, _, value = stripped.partition("=")
+                device["properties"][key.strip()] = value.strip().strip('"')
+            elif section == "ports":
+                key, _, value = stripped.partition(":")
+                device["ports"][key.strip()] = value.strip()
+            elif section == "formats":
+                device["formats"].append(stripped)
+            continue
+        if stripped.startswith("balance"):
+            # Continuation of the volume line
+            device["balance"] = stripped[len("balance"):].strip()
+            continue
+        key, _, value = stripped.partition(":")
+        key = key.strip()
+        value = value.strip()
+        section_name = SECTION_NAMES.get(key.lower())
+        if section_name and not value:
+            section = section_name
+            device[section] = [] if section == "formats" else {}
+        else:
+            section = None
+            device[key] = value
+    return devices
+
+def parse_pactl_json(output):
+    # `pactl -f json list` output, converted to the same layout as the text parser
+    devices = []
+    for item in json.loads(output):
+        device = {
+            "id": str(item.get("index")),
+            "Name": item.get("name", ""),
+            "Description": item.get("description", ""),
+            "State": item.get("state", ""),
+            "Driver": item.get("driver", ""),
+            "properties": {key: str(value) for key, value in item.get("properties", {}).items()},
+            "ports": {port.get("name", ""): port.get("description", "") for port in item.get("ports", [])},
+            "formats": list(item.get("formats", [])),
+        }
+        if item.get("active_port") is not None:
+            device["Active Port"] = item["active_port"]
+        if "monitor_source" in item:
+            device["Monitor Source"] = item["monitor_source"]
+        if "monitor_of_sink" in item:
+            device["Monitor of Sink"] = item["monitor_of_sink"]
+        devices.append(device)
+    return devices
+
+def run_pactl(kind):
+    # pactl versions with JSON output are parsed with json, older ones fall back to the text output
+    try:
+        result = subprocess.run(["pactl", "-f", "json", "list", kind], capture_output=True, text=True)
+        if result.returncode == 0:
+            try:
+                return parse_pactl_json(result.stdout)
+            except ValueError:
+                pass
+        result = subprocess.run(["pactl", "list", kind], capture_output=True, text=True)
+    except FileNotFoundError:
+        warnings.warn("pactl not found. Please install pulseaudio-utils with 'sudo apt install pulseaudio-utils'")
+        return []
+    return parse_pactl_list(result.stdout)
+
+class Device_cache:
+    def __init__(self, run=run_pactl):
+        self.run = run
+        self.devices = {}
+        self.lock = threading.Lock()
+        self.monitor_process = None
+        self.monitor_thread = None
+
+    def get(self, kind):
+        # pactl is only spawned the first time and after a subscribe event invalidated the list
+        with self.lock:
+            if kind not in self.devices:
+                self.devices[kind] = self.run(kind)
+            return list(self.devices[kind])
+
+    def invalidate(self, kind=None):
+        with self.lock:
+            if kind is None:
+                self.devices.clear()
+            else:
+                self.devices.pop(kind, None)
+
+    def handle_event(self, line):
+        # e.g. "Event 'new' on sink #3", "Event 'remove' on source #5"
+        parts = line.split()
+        if len(parts) < 4 or parts[0] != "Event":
+            return
+        event = parts[1].strip("'")
+        kind = {"sink": SINKS, "source": SOURCES}.get(parts[3])
+        if kind is None:
+            return
+        device_id = parts[-1].lstrip("#")
+        with self.lock:
+            if kind not in self.devices:
+                return
+            if event == "remove":
+                # Removed devices are dropped from the cached list without calling pactl
+                self.devices[kind] = [device for device in self.devices[kind] if device["id"] != device_id]
+            else:
+                self.devices.pop(kind, None)
+
+    def start_monitor(self):
+        # Keep the cache up to date with a single long running `pactl subscribe`
+        try:
+            self.monitor_process = subprocess.Popen(["pactl", "subscribe"], stdout=subprocess.PIPE, text=True)
+        except FileNotFoundError:
+            warnings.warn("pactl not found, device list will not be refreshed")
+            return False
+        def run():
+            for line in self.monitor_process.stdout:
+                self.handle_event(line)
+        self.monitor_thread = threading.Thread(target=run, daemon=True)
+        self.monitor_thread.start()
+        return True
+
+    def stop_monitor(self):
+        if self.monitor_process is not None:
+            self.monitor_process.terminate()
+            self.monitor_process = None
+
+device_cache = Device_cache()
+
+def get_device_name(device):
+    # pactl prints field names in the language of the system too
+    return device.get("Name") or device.get("Nombre", "")
+
+def is_source_available(name):
+    # Monitors of the sinks are sources too
+    return any(get_device_name(device) == name for device in device_cache.get(SOURCES))
+
+def list_sink_devices(debug=False):
+    sink_devices_list = device_cache.get(SINKS)
+    if debug:
+        for sink_device in sink_devices_list:
+            print(f"\tOutput device: {sink_device['id']}")
+    return sink_devices_list
+
+def list_source_devices(debug=False):
+    source_devices_list = device_cache.get(SOURCES)
+    if debug:
+        for source_device in source_devices_list:
+            print(f"\tInput device: {source_device['id']}")
+    return source_devices_list
@@ -0,0 +1,112 @@
+import importlib
+import importlib.util
+from time import perf_counter
+from model_cache import set_offline
+
+TRANSLATOR = "translator"
+TRANSCRIBER = "transcriber"
+
+class Backend:
+    def __init__(self, name, kind, module, attribute, dependencies=()):
+        self.name = name
+        self.kind = kind
+        self.module = module
+        self.attribute = attribute
+        self.dependencies = list(dependencies)
+        self.backend_class = None
+        self.import_time = None
+        self.load_time = None
+
+    def missing_dependencies(self):
+        # find_spec looks for the package without importing it
+        return [dependency for dependency in self.dependencies if importlib.util.find_spec(dependency) is None]
+
+class Backend_registry:
+    def __init__(self):
+        self.backends = {}
+
+    def register(self, name, kind, module, attribute, dependencies=()):
+        self.backends[name] = Backend(name, kind, module, attribute, dependencies)
+
+    def names(self, kind):
+        return [name for name, backend in self.backends.items() if backend.kind == kind]
+
+    def get(self, name):
+        if name not in self.backends:
+            raise ValueError(f"Unknown backend '{name}', use one of {list(self.backends)}")
+        return self.backends[name]
+
+    def get_class(self, name):
+        # The backend module, and its heavy dependencies, are only imported the first time it is used
+        backend = self.get(name)
+        if backend.backend_class is None:
+            start = perf_counter()
+            module = importlib.import_module(backend.module)
+            backend.backend_class = getattr(module, backend.attribute)
+            backend.import_time = perf_counter() - start
+        return backend.backend_class
+
+    def create(self, name, **kwargs):
+        backend_class = self.get_class(name)
+        start = perf_counter()
+        instance = backend_class(**kwargs)
+        self.get(name).load_time = perf_counter() - start
+        return instance
+
+    def timings(self):
+        return {
+            name: {"import_time": backend.import_time, "load_time": backend.load_time}
+            for name, backend in self.backends.items()
+            if backend.import_time is not None
+        }
+
+    def report(self):
+        for name, timing in self.timings().items():
+            load_time = f"{timing['load_time']:.2f}s" if timing["load_time"] is not None else "not loaded"
+            print(f"\tBackend {name}: import {timing['import_time']:.2f}s, load {load_time}")
+
+registry = Backend_registry()
+registry.register("qwen", TRANSLATOR, "translator", "Translator", dependencies=["torch", "transformers", "huggingface_hub", "dotenv", "safetensors"])
+registry.register("ollama", TRANSLATOR, "llama_3_1_1B", "Llama_3_1_1B", dependencies=["ollama"])
+registry.register("whisper", TRANSCRIBER, "whisper_model", "Whisper", dependencies=["whisper", "torch", "numpy", "safetensors"])
+registry.register("stub_translator", TRANSLATOR, "stub_backends", "Stub_translator")
+registry.register("stub_transcriber", TRANSCRIBER, "stub_backends", "Stub_transcriber")
+registry.register("remote_translator", TRANSLATOR, "model_server", "Remote_translator", dependencies=["numpy"])
+registry.register("remote_transcriber", TRANSCRIBER, "model_server", "Remote_transcriber", dependencies=["numpy"])
+
+DEVICES = ["auto", "cuda", "cpu"]
+
+def add_backend_arguments(parser):
+    # Options of the models shared by every command line tool
+    parser.add_argument("--device", default="auto", choices=DEVICES, help="Device to run the models on")
+    parser.add_argument("--quantize", action="store_true", help="Apply int8 dynamic quantization to the models, CPU only")
+    parser.add_argument("--threads", type=int, default=None, help="Number of intra-op threads used by PyTorch on CPU")
+    parser.add_argument("--draft_model", default=None, help="Draft model for speculative decoding of the qwen translator, e.g. Qwen/Qwen2.5-0.5B-Instruct")
+    parser.add_argument("--offline", action="store_true", help="Do not connect to the Hugging Face hub, models are loaded from the local caches")
+    parser.add_argument("--no_model_cache", action="store_true", help="Load the models from their original checkpoints instead of the converted safetensors cache")
+
+def check_backend_arguments(parser, args):
+    # int8 dynamic quantization only runs on CPU, with --device auto the models are loaded on the CPU
+    if args.quantize and args.device == "cuda":
+        parser.error("--quantize only runs on CPU, use --device cpu or --device auto")
+
+def create_backends(args):
+    # Transcriber and translator selected in the command line arguments
+    if getattr(args, "offline", False):
+        set_offline()
+    if getattr(args, "server", None):
+        transcriber = registry.create("remote_transcriber", url=args.server)
+        translator = registry.create("remote_translator", url=args.server)
+        return transcriber, translator
+    if getattr(args, "threads", None):
+        import torch
+        torch.set_num_threads(args.threads)
+    use_model_cache = not getattr(args, "no_model_cache", False)
+    transcriber_kwargs = {"use_model_cache": use_model_cache} if args.transcriber == "whisper" else {}
+    transcriber = registry.create(args.transcriber, model_size=args.whisper_model, device=args.device, quantize=args.quantize, **transcriber_kwargs)
+    translator_kwargs = {}
+    if args.translator == "qwen":
+        translator_kwargs = {"device": args.device, "quantize": args.quantize, "draft_checkpoints": getattr(args, "draft_model", None),
+                             "use_model_cache": use_model_cache}
+    translator = registry.create(args.translator, **translator_kwargs)
+    return transcriber, translator
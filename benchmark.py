@@ -0,0 +1,206 @@
+import argparse
+import json
+import resource
+import wave
+from datetime import datetime, timedelta
+from time import perf_counter, sleep
+import numpy as np
+from audio_buffer import SAMPLE_RATE
+from backends import registry, create_backends, TRANSLATOR, TRANSCRIBER, add_backend_arguments, check_backend_arguments
+from translation_cache import Translation_cache, Cached_translator
+from stages import Transcription_stage, Translation_stage
+
+def load_audio(path, sample_rate=SAMPLE_RATE):
+    # WAV files are converted to 16 bit mono at the sample rate of the recorder,
+    # any other file is read as raw 16 bit mono PCM already at that sample rate
+    if not path.lower().endswith(".wav"):
+        return np.fromfile(path, dtype=np.int16)
+    with wave.open(path, "rb") as file:
+        if file.getsampwidth() != 2:
+            raise ValueError(f"{path}: only 16 bit WAV files are supported")
+        num_channels = file.getnchannels()
+        file_sample_rate = file.getframerate()
+        audio = np.frombuffer(file.readframes(file.getnframes()), dtype=np.int16)
+    if num_channels > 1:
+        audio = audio.reshape(-1, num_channels).mean(axis=1)
+    if file_sample_rate != sample_rate:
+        num_samples = int(len(audio) * sample_rate / file_sample_rate)
+        audio = np.interp(np.linspace(0, len(audio) - 1, num_samples), np.arange(len(audio)), audio)
+    return audio.astype(np.int16)
+
+def get_chunks(audio, record_timeout, energy_threshold, sample_rate=SAMPLE_RATE):
+    # Same chunking as listen_in_background: chunks of record_timeout seconds,
+    # and nothing is recorded while the energy is below the threshold
+    chunk_length = int(record_timeout * sample_rate)
+    chunks = []
+    for start in range(0, len(audio), chunk_length):
+        chunk = audio[start:start + chunk_length]
+        energy = np.sqrt(np.mean(chunk.astype(np.float64) ** 2))
+        if energy < energy_threshold:
+            continue
+        chunks.append(((start + len(chunk)) / sample_rate, chunk.tobytes()))
+    return chunks
+
+def get_percentiles(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": float(np.mean(values)),
+        "p50": float(np.percentile(values, 50)),
+        "p90": float(np.percentile(values, 90)),
+        "p99": float(np.percentile(values, 99)),
+        "max": float(np.max(values)),
+    }
+
+CACHE_KEY_ATTRIBUTES = ("checkpoints", "model", "sistem_prompt")
+
+class Token_counter:
+    # Counts the generated tokens of every translation, words when the backend has no tokenizer.
+    # It wraps the backend directly, so with the cache in front only the tokens the model generated are counted
+    def __init__(self, translator):
+        self.translator = translator
+        self.tokenizer = getattr(translator, "tokenizer", None)
+        self.num_tokens = 0
+
+    def __getattr__(self, name):
+        # The cache keys use the model name and system prompt of the backend, other methods would skip the count
+        if name in CACHE_KEY_ATTRIBUTES:
+            return getattr(self.translator, name)
+        raise AttributeError(name)
+
+    def count(self, text):
+        if self.tokenizer is not None:
+            self.num_tokens += len(self.tokenizer(text, add_special_tokens=False).input_ids)
+        else:
+            self.num_tokens += len(text.split())
+
+    def translate(self, text):
+        translation = self.translator.translate(text)
+        self.count(translation)
+        return translation
+
+    def translate_batch(self, texts):
+        translations = self.translator.translate_batch(texts)
+        for translation in translations:
+            self.count(translation)
+        return translations
+
+def replay(path, transcriber, translator, args, cache=None):
+    audio = load_audio(path)
+    audio_seconds = len(audio) / SAMPLE_RATE
+    chunks = get_chunks(audio, args.record_timeout, args.energy_threshold)
+
+    # Phrase timeouts follow the position in the file, not the wall clock
+    stream_start = datetime(2000, 1, 1)
+    position = 0.0
+    def clock():
+        return stream_start + timedelta(seconds=position)
+
+    token_counter = Token_counter(translator)
+    if cache is not None:
+        translator = Cached_translator(token_counter, cache)
+    else:
+        translator = token_counter
+    transcription_stage = Transcription_stage(transcriber, use_vad=not args.no_vad, phrase_timeout=args.phrase_timeout,
+                                              max_window_seconds=args.max_window_seconds, clock=clock)
+    translation_stage = Translation_stage(translator, incremental=not args.no_incremental)
+
+    end_to_end = []
+    pending = []
+    next_chunk = 0
+    start = perf_counter()
+    while next_chunk < len(chunks) or pending:
+        if args.realtime:
+            # Chunks arrive when they would have been recorded, everything that arrived
+            # while the previous tick was running is transcribed together like in the pipeline
+            if not pending:
+                sleep(max(0.0, chunks[next_chunk][0] - (perf_counter() - start)))
+            while next_chunk < len(chunks) and chunks[next_chunk][0] <= perf_counter() - start:
+                pending.append(chunks[next_chunk])
+                next_chunk += 1
+        else:
+            pending.append(chunks[next_chunk])
+            next_chunk += 1
+        tick_start = perf_counter()
+        arrival = pending[0][0]
+        position = pending[-1][0]
+        item = transcription_stage([data for _, data in pending])
+        pending = []
+        lines = translation_stage(item) if item is not None else None
+        if lines is not None:
+            # Real time latency is counted from the moment the oldest chunk was recorded
+            end_to_end.append(perf_counter() - start - arrival if args.realtime else perf_counter() - tick_start)
+    wall_seconds = perf_counter() - start
+
+    return {
+        "file": path,
+        "audio_seconds": audio_seconds,
+        "wall_seconds": wall_seconds,
+        "chunks": len(chunks),
+        "real_time_factor": {
+            "transcription": transcription_stage.busy_seconds / audio_seconds,
+            "translation": translation_stage.busy_seconds / audio_seconds,
+            "total": (transcription_stage.busy_seconds + translation_stage.busy_seconds) / audio_seconds,
+        },
+        "latency": {
+            "transcription": get_percentiles(transcription_stage.latencies),
+            "translation": get_percentiles(translation_stage.latencies),
+            "end_to_end": get_percentiles(end_to_end),
+        },
+        "translation_tokens": token_counter.num_tokens,
+        "translation_tokens_per_second": token_counter.num_tokens / translation_stage.busy_seconds if translation_stage.busy_seconds else 0.0,
+        "transcription": translation_stage.transcription,
+    }
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay audio files through the transcription and translation stages")
+    parser.add_argument("files", nargs="+", help="WAV files, or raw 16 bit mono PCM at 16 kHz")
+    parser.add_argument("--transcriber", default="whisper", choices=registry.names(TRANSCRIBER))
+    parser.add_argument("--translator", default="qwen", choices=registry.names(TRANSLATOR))
+    parser.add_argument("--whisper_model", default="tiny.en")
+    add_backend_arguments(parser)
+    parser.add_argument("--record_timeout", type=float, default=2)
+    parser.add_argument("--phrase_timeout", type=float, default=3)
+    parser.add_argument("--max_window_seconds", type=float, default=30)
+    parser.add_argument("--energy_threshold", type=int, default=1000)
+    parser.add_argument("--no_vad", action="store_true")
+    parser.add_argument("--no_incremental", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="Put the translation cache in front of the translator")
+    parser.add_argument("--realtime", action="store_true", help="Feed the audio at real time speed instead of as fast as possible")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    args = parser.parse_args()
+    check_backend_arguments(parser, args)
+    return args
+
+def main():
+    args = parse_args()
+
+    transcriber, translator = create_backends(args)
+    # One cache for all the files, like a session that keeps running
+    cache = Translation_cache() if args.cache else None
+
+    results = {
+        "config": vars(args),
+        "backends": registry.timings(),
+        "runs": [replay(path, transcriber, translator, args, cache) for path in args.files],
+    }
+    # ru_maxrss is in kilobytes on Linux
+    results["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    for run in results["runs"]:
+        print(f"{run['file']}: {run['audio_seconds']:.1f}s of audio in {run['wall_seconds']:.1f}s")
+        print(f"\tReal time factor: {run['real_time_factor']['total']:.3f}")
+        for stage, latency in run["latency"].items():
+            if latency["count"]:
+                print(f"\t{stage} latency p50 {latency['p50'] * 1000:.1f}ms, p90 {latency['p90'] * 1000:.1f}ms, p99 {latency['p99'] * 1000:.1f}ms")
+        print(f"\tTranslation tokens per second: {run['translation_tokens_per_second']:.1f}")
+    print(f"Peak RSS: {results['peak_rss_mb']:.0f}MB")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
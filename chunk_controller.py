@@ -0,0 +1,116 @@
+WHISPER_SIZES = ["tiny", "base", "small"]
+TARGET_RTF = 0.8
+LOW_RTF_RATIO = 0.5 # Below this fraction of the target there is margin to lower the latency again
+RECORD_TIMEOUT_STEP = 1.5
+MIN_RECORD_TIMEOUT = 1.0
+MAX_RECORD_TIMEOUT = 5.0
+PHRASE_TIMEOUT_MARGIN = 1.0
+INTERVAL_SECONDS = 10.0
+MODEL_RETRY_WINDOWS = 6 # Windows to wait before trying a bigger model again, doubles every time one was too slow
+
+def get_model_ladder(model_size):
+    # Smaller Whisper models to fall back to, the requested one is the biggest that is used
+    suffix = ".en" if model_size.endswith(".en") else ""
+    name = model_size[:-len(suffix)] if suffix else model_size
+    smaller = WHISPER_SIZES[:WHISPER_SIZES.index(name)] if name in WHISPER_SIZES else WHISPER_SIZES
+    return [size + suffix for size in smaller] + [model_size]
+
+class Chunk_controller:
+    # Every interval seconds of processed audio compares the time spent transcribing and translating with the audio
+    # duration. Too slow: longer chunks first, every chunk retranscribes the whole phrase so fewer chunks is less work,
+    # then a smaller Whisper model. Fast enough: shorter chunks first for lower latency, then a bigger model again
+    def __init__(self, transcription_stage, translation_stage, record_timeout, restart_recorder=None,
+                 model_ladder=None, load_transcriber=None, target_rtf=TARGET_RTF, min_record_timeout=MIN_RECORD_TIMEOUT,
+                 max_record_timeout=MAX_RECORD_TIMEOUT, interval=INTERVAL_SECONDS, metrics=None):
+        self.transcription_stage = transcription_stage
+        self.translation_stage = translation_stage
+        self.record_timeout = record_timeout
+        self.phrase_timeout = transcription_stage.phrase_timeout
+        # restart_recorder(record_timeout) restarts the capture with the new chunk length
+        self.restart_recorder = restart_recorder
+        # load_transcriber(model_size) returns a new transcriber, without it the model size is not adapted
+        self.model_ladder = model_ladder if load_transcriber is not None and model_ladder else []
+        self.load_transcriber = load_transcriber
+        self.model_index = len(self.model_ladder) - 1
+        # After a model was too slow a bigger one is only tried again after a backoff, so models are not reloaded all the time
+        self.num_windows = 0
+        self.model_retry_windows = MODEL_RETRY_WINDOWS
+        self.model_retry_window = 0
+        self.target_rtf = target_rtf
+        self.min_record_timeout = min_record_timeout
+        self.max_record_timeout = max_record_timeout
+        self.interval = interval
+        self.metrics = metrics
+        self.last_audio_seconds = transcription_stage.audio_seconds
+        self.last_busy_seconds = self.get_busy_seconds()
+        self.real_time_factor = None
+        self.decisions = []
+
+    def get_busy_seconds(self):
+        return self.transcription_stage.busy_seconds + self.translation_stage.busy_seconds
+
+    def tick(self):
+        # Called periodically, returns the decision taken or None
+        audio_seconds = self.transcription_stage.audio_seconds - self.last_audio_seconds
+        if audio_seconds < self.interval:
+            return None
+        busy_seconds = self.get_busy_seconds()
+        self.real_time_factor = (busy_seconds - self.last_busy_seconds) / audio_seconds
+        self.num_windows += 1
+        decision = self.decide(self.real_time_factor)
+        # Time spent applying the decision, like loading a model, is not counted in the next window
+        self.last_audio_seconds = self.transcription_stage.audio_seconds
+        self.last_busy_seconds = self.get_busy_seconds()
+        if self.metrics is not None:
+            self.metrics.set_gauge("controller_real_time_factor", self.real_time_factor)
+            self.metrics.set_gauge("controller_record_timeout", self.record_timeout)
+            self.metrics.set_gauge("controller_model_index", self.model_index)
+        return decision
+
+    def decide(self, real_time_factor):
+        if real_time_factor > self.target_rtf:
+            if self.record_timeout < self.max_record_timeout:
+                return self.set_record_timeout(min(self.max_record_timeout, self.record_timeout * RECORD_TIMEOUT_STEP), real_time_factor)
+            if self.model_index > 0:
+                self.model_retry_window = self.num_windows + self.model_retry_windows
+                self.model_retry_windows *= 2
+                return self.set_model(self.model_index - 1, real_time_factor)
+        elif real_time_factor < self.target_rtf * LOW_RTF_RATIO:
+            if self.record_timeout > self.min_record_timeout:
+                return self.set_record_timeout(max(self.min_record_timeout, self.record_timeout / RECORD_TIMEOUT_STEP), real_time_factor)
+            if self.model_index < len(self.model_ladder) - 1 and self.num_windows >= self.model_retry_window:
+                return self.set_model(self.model_index + 1, real_time_factor)
+        return None
+
+    def set_record_timeout(self, record_timeout, real_time_factor):
+        record_timeout = round(record_timeout, 2)
+        decision = self.log("record_timeout", self.record_timeout, record_timeout, real_time_factor)
+        self.record_timeout = record_timeout
+        # Chunks arrive every record_timeout seconds, a shorter phrase timeout would end every phrase
+        self.transcription_stage.phrase_timeout = max(self.phrase_timeout, record_timeout + PHRASE_TIMEOUT_MARGIN)
+        if self.restart_recorder is not None:
+            self.restart_recorder(record_timeout)
+        return decision
+
+    def set_model(self, model_index, real_time_factor):
+        model_size = self.model_ladder[model_index]
+        decision = self.log("model_size", self.model_ladder[self.model_index], model_size, real_time_factor)
+        # The new model is loaded while the old one keeps transcribing, then they are swapped
+        self.transcription_stage.transcriber = self.load_transcriber(model_size)
+        self.model_index = model_index
+        return decision
+
+    def log(self, setting, old_value, new_value, real_time_factor):
+        decision = {
+            "audio_seconds": self.transcription_stage.audio_seconds,
+            "real_time_factor": real_time_factor,
+            "target_rtf": self.target_rtf,
+            "setting": setting,
+            "old": old_value,
+            "new": new_value,
+        }
+        self.decisions.append(decision)
+        print(f"\nChunk controller: real time factor {real_time_factor:.2f} (target {self.target_rtf:.2f}), {setting} {old_value} -> {new_value}", flush=True)
+        if self.metrics is not None:
+            self.metrics.increment("controller_decisions", setting=setting)
+        return decision
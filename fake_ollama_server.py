@@ -0,0 +1,100 @@
+import argparse
+import json
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep
+
+HOST = "127.0.0.1"
+PORT = 11435
+LATENCY = 0.2 # Seconds before the first token
+TOKEN_LATENCY = 0.02 # Seconds between streamed tokens
+
+class Fake_ollama_server(ThreadingHTTPServer):
+    # Answers /api/chat like Ollama does, echoing the user text, so the client can be tested offline
+    daemon_threads = True
+
+    def __init__(self, host=HOST, port=PORT, latency=LATENCY, token_latency=TOKEN_LATENCY):
+        super().__init__((host, port), Fake_ollama_handler)
+        self.latency = latency
+        self.token_latency = token_latency
+        self.lock = threading.Lock()
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self.num_requests = 0
+
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+class Fake_ollama_handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so connection reuse can be observed
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if self.path != "/api/chat":
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        server = self.server
+        with server.lock:
+            server.num_requests += 1
+            server.active_requests += 1
+            server.max_active_requests = max(server.max_active_requests, server.active_requests)
+        try:
+            text = body["messages"][-1]["content"]
+            tokens = [f"{word} " for word in f"[es] {text}".split()]
+            sleep(server.latency)
+            if body.get("stream", True):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for token in tokens:
+                    self.write_chunk(self.get_message(body, token, done=False))
+                    sleep(server.token_latency)
+                self.write_chunk(self.get_message(body, "", done=True))
+                self.wfile.write(b"0\r\n\r\n")
+            else:
+                sleep(server.token_latency * len(tokens))
+                data = json.dumps(self.get_message(body, "".join(tokens).strip(), done=True)).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+        finally:
+            with server.lock:
+                server.active_requests -= 1
+
+    def get_message(self, body, content, done):
+        return {
+            "model": body.get("model", ""),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": content},
+            "done": done,
+        }
+
+    def write_chunk(self, message):
+        data = (json.dumps(message) + "\n").encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama server to test the translators offline")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--latency", type=float, default=LATENCY)
+    parser.add_argument("--token_latency", type=float, default=TOKEN_LATENCY)
+    args = parser.parse_args()
+    server = Fake_ollama_server(args.host, args.port, args.latency, args.token_latency)
+    print(f"Fake Ollama server listening on {server.url()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(f"Requests: {server.num_requests}, max concurrent requests: {server.max_active_requests}")
+
+if __name__ == "__main__":
+    main()
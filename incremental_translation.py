@@ -0,0 +1,63 @@
+class Incremental_transcript:
+    def __init__(self, translator, empty_translation=''):
+        self.translator = translator
+        # Translation of an empty line, a dict of empty strings when translating to several languages
+        self.empty_translation = empty_translation
+        self.transcription = ['']
+        self.translations = [empty_translation]
+        self.translator_calls = 0
+        # Lines before this index are all translated, so pending() does not scan the whole transcript
+        self.first_pending = 0
+
+    def update_text(self, text, phrase_complete, completed=()):
+        # Completed phrases are frozen together with their translation, only the live tail is translated.
+        # Lines waiting for a translation have None as translation
+        if phrase_complete:
+            # Final texts of the lines ended by this update, the first one is the live line, None keeps its text
+            for i, line in enumerate(completed):
+                if i:
+                    self.add_line(line)
+                elif line is not None and line != self.transcription[-1]:
+                    self.set_line(len(self.transcription) - 1, line)
+            self.add_line(text)
+        elif text == self.transcription[-1] and self.translations[-1] is not None:
+            # Whisper returned the same text as in the previous tick, nothing to translate
+            return False
+        else:
+            self.set_line(len(self.transcription) - 1, text)
+        return True
+
+    def add_line(self, text):
+        self.transcription.append(text)
+        self.translations.append(None)
+        self.mark_pending(len(self.transcription) - 1)
+
+    def set_line(self, index, text):
+        self.transcription[index] = text
+        self.translations[index] = None
+        self.mark_pending(index)
+
+    def mark_pending(self, index):
+        if not self.transcription[index]:
+            self.translations[index] = self.empty_translation
+        else:
+            self.first_pending = min(self.first_pending, index)
+
+    def pending(self):
+        while self.first_pending < len(self.translations) and self.translations[self.first_pending] is not None:
+            self.first_pending += 1
+        return [i for i in range(self.first_pending, len(self.translations)) if self.translations[i] is None]
+
+    def set_translation(self, index, translation):
+        self.translations[index] = translation
+        self.translator_calls += 1
+
+    def update(self, text, phrase_complete, completed=()):
+        if not self.update_text(text, phrase_complete, completed):
+            return False
+        for i in self.pending():
+            self.set_translation(i, self.translator.translate(self.transcription[i]))
+        return True
+
+    def lines(self, start=0):
+        return zip(self.transcription[start:], self.translations[start:])
@@ -0,0 +1,34 @@
+TARGET_LANGUAGE = "Spanish"
+LANGUAGE_PLACEHOLDER = "<<language>>"
+SYSTEM_PROMPT = f"You are an expert translator, your mission is to translate texts from English to {LANGUAGE_PLACEHOLDER}. You will receive texts in English, respond only with the {LANGUAGE_PLACEHOLDER} translation, nothing else."
+MULTI_TARGET_SYSTEM_PROMPT = "You are an expert translator. You will receive a text in English followed by the language to translate it to, respond only with the translation, nothing else."
+MULTI_TARGET_INSTRUCTION = f"Translate the text above to {LANGUAGE_PLACEHOLDER}."
+# Target languages can be given by code, the prompt uses the name
+LANGUAGE_NAMES = {
+    "es": "Spanish",
+    "fr": "French",
+    "de": "German",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "nl": "Dutch",
+    "ca": "Catalan",
+    "ru": "Russian",
+    "zh": "Chinese",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "ar": "Arabic",
+}
+
+def get_language_name(language):
+    return LANGUAGE_NAMES.get(language.lower(), language)
+
+def parse_languages(text):
+    # "es,fr" or "Spanish, French"
+    return [language.strip() for language in text.split(",") if language.strip()] if text else []
+
+def get_multi_target_messages(text, language):
+    # The source text goes before the target language, so the chats of every language share all the tokens up to it
+    return [
+        {"role": "system", "content": MULTI_TARGET_SYSTEM_PROMPT},
+        {"role": "user", "content": f"{text}\n\n{MULTI_TARGET_INSTRUCTION.replace(LANGUAGE_PLACEHOLDER, language)}"},
+    ]
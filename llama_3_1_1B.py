@@ -1,24 +1,52 @@
 import ollama
+from languages import get_language_name, get_multi_target_messages
 
-response = ollama.chat(model='llama3.2_translator_1B:latest', messages=[
-  {
-    'role': 'user',
-    'content': 'the white table is in the kitchen',
-  },
-])
-print(response['message']['content'])
+MODEL = 'llama3.2_translator_1B:latest'
+KEEP_ALIVE = '30m' # Keep the weights loaded in Ollama between segments
 
 class Llama_3_1_1B:
-    def __init__(self, model='llama3.2_translator_1B:latest'):
+    def __init__(self, model=MODEL, host=None, keep_alive=KEEP_ALIVE):
         self.model = model
-    
+        self.keep_alive = keep_alive
+        # A single client reuses the HTTP connection for every segment
+        self.client = ollama.Client(host=host)
+
     def translate(self, text):
-        response = ollama.chat(model='llama3.2_translator_1B:latest', messages=[
+        response = self.client.chat(model=self.model, messages=[
             {
                 'role': 'user',
                 'content': text,
             },
-        ])
+        ], keep_alive=self.keep_alive)
         return response['message']['content']
 
+    def translate_stream(self, text):
+        # Yield the translation as Ollama streams it
+        stream = self.client.chat(model=self.model, messages=[
+            {
+                'role': 'user',
+                'content': text,
+            },
+        ], keep_alive=self.keep_alive, stream=True)
+        for chunk in stream:
+            content = chunk['message']['content']
+            if content:
+                yield content
+
+    def translate_multi(self, text, languages):
+        # The system message replaces the one of the Modelfile. Ollama serves one request at a time,
+        # so the languages are translated one after the other
+        translations = {}
+        for language in languages:
+            messages = get_multi_target_messages(text, get_language_name(language))
+            response = self.client.chat(model=self.model, messages=messages, keep_alive=self.keep_alive)
+            translations[language] = response['message']['content'].strip()
+        return translations
+
+    def translate_batch(self, texts):
+        # Ollama serves one request at a time, so the batch is translated sequentially
+        return [self.translate(text) for text in texts]
 
+if __name__ == "__main__":
+    translator = Llama_3_1_1B()
+    print(translator.translate('the white table is in the kitchen'))
@@ -0,0 +1,188 @@
+import cProfile
+import json
+import pstats
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter, time
+
+PREFIX = "real_time_translator"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+def format_labels(labels, extra=()):
+    labels = list(labels) + list(extra)
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bucket in enumerate(self.buckets):
+            if value <= bucket:
+                self.counts[i] += 1
+
+class Metrics:
+    def __init__(self, prefix=PREFIX):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        # Every metric is keyed by its name and a tuple of (label, value) pairs
+        self.counters = {}
+        self.gauges = {}
+        self.gauge_callbacks = {}
+        self.histograms = {}
+        self.server = None
+        self.jsonl_thread = None
+        self.jsonl_stop = threading.Event()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self.lock:
+            self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def register_gauge(self, name, callback, **labels):
+        # The callback is read at export time, e.g. the depth of a queue
+        with self.lock:
+            self.gauge_callbacks[(name, tuple(sorted(labels.items())))] = callback
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def get_gauges(self):
+        gauges = dict(self.gauges)
+        for key, callback in self.gauge_callbacks.items():
+            gauges[key] = callback()
+        return gauges
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "timestamp": time(),
+                "counters": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.counters.items()],
+                "gauges": [{"name": name, "labels": dict(labels), "value": value} for (name, labels), value in self.get_gauges().items()],
+                "timers": [
+                    {"name": name, "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                     "buckets": dict(zip(histogram.buckets, histogram.counts))}
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{self.prefix}_{name}_total{format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.get_gauges().items()):
+                lines.append(f"{self.prefix}_{name}{format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items()):
+                metric = f"{self.prefix}_{name}_seconds"
+                for bucket, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f"{metric}_bucket{format_labels(labels, [('le', bucket)])} {count}")
+                lines.append(f"{metric}_bucket{format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+                lines.append(f"{metric}_sum{format_labels(labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def serve(self, port, host="127.0.0.1"):
+        # Prometheus text endpoint at http://host:port/metrics
+        metrics = self
+        class Metrics_handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                data = metrics.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer((host, port), Metrics_handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.server
+
+    def write_jsonl(self, path):
+        with open(path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(self.snapshot()) + "\n")
+
+    def start_jsonl(self, path, interval=10):
+        # Append a snapshot every interval seconds, and a last one when stopped
+        def run():
+            while not self.jsonl_stop.wait(interval):
+                self.write_jsonl(path)
+            self.write_jsonl(path)
+        self.jsonl_thread = threading.Thread(target=run, daemon=True)
+        self.jsonl_thread.start()
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+        if self.jsonl_thread is not None:
+            self.jsonl_stop.set()
+            self.jsonl_thread.join()
+
+class Profile_window:
+    # Profiles the stage functions of every thread between start and start + duration seconds,
+    # the merged stats are written in cProfile format, readable with pstats, snakeviz or flameprof
+    def __init__(self, duration, path, start=0):
+        self.path = path
+        self.start_time = perf_counter() + start
+        self.end_time = self.start_time + duration
+        self.profilers = []
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.dumped = False
+
+    def run(self, function, *args):
+        now = perf_counter()
+        if now < self.start_time or self.dumped:
+            return function(*args)
+        if now > self.end_time:
+            self.dump()
+            return function(*args)
+        profiler = getattr(self.local, "profiler", None)
+        if profiler is None:
+            # cProfile only sees the thread it runs in, so every thread gets its own profiler
+            profiler = cProfile.Profile()
+            self.local.profiler = profiler
+            with self.lock:
+                self.profilers.append(profiler)
+        return profiler.runcall(function, *args)
+
+    def dump(self):
+        with self.lock:
+            if self.dumped or not self.profilers:
+                return
+            self.dumped = True
+            stats = pstats.Stats(self.profilers[0])
+            for profiler in self.profilers[1:]:
+                stats.add(profiler)
+            stats.dump_stats(self.path)
+        print(f"Profile written to {self.path}")
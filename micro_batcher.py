@@ -0,0 +1,64 @@
+import threading
+from queue import Queue, Empty
+from concurrent.futures import Future
+from time import monotonic
+
+MAX_BATCH_SIZE = 8
+MAX_WAIT_MS = 5
+
+class Micro_batcher:
+    def __init__(self, translator, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.translator = translator
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.requests = Queue()
+        self.running = True
+        # Held while the translator runs, other calls to the same model take it too
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def submit(self, text):
+        future = Future()
+        self.requests.put((text, future))
+        return future
+
+    def translate(self, text):
+        return self.submit(text).result()
+
+    def collect_batch(self):
+        # Block for the first request, then wait a few milliseconds for concurrent callers to join
+        try:
+            batch = [self.requests.get(timeout=0.1)]
+        except Empty:
+            return []
+        deadline = monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.requests.get(timeout=remaining))
+            except Empty:
+                break
+        return batch
+
+    def run(self):
+        while self.running:
+            batch = self.collect_batch()
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            try:
+                with self.lock:
+                    translations = self.translator.translate_batch(texts)
+            except Exception as exception:
+                for _, future in batch:
+                    future.set_exception(exception)
+                continue
+            for (_, future), translation in zip(batch, translations):
+                future.set_result(translation)
+
+    def stop(self):
+        self.running = False
+        self.thread.join()
@@ -0,0 +1,44 @@
+import os
+import shutil
+import tempfile
+import warnings
+
+# Converted weights are kept here as safetensors, they are memory mapped when loaded so every
+# process that loads the same model reads it from the page cache
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "real_time_translator"))
+
+def is_offline():
+    return os.getenv("HF_HUB_OFFLINE", "0") == "1" or os.getenv("TRANSFORMERS_OFFLINE", "0") == "1"
+
+def set_offline():
+    # Read by huggingface_hub when it is imported, so it must be set before the backends are loaded
+    os.environ["HF_HUB_OFFLINE"] = "1"
+
+def get_model_dir(name, variant, cache_dir=None):
+    return os.path.join(cache_dir or MODEL_CACHE_DIR, f"{name.replace('/', '--')}--{variant}")
+
+def is_cached(model_dir):
+    # Models are renamed into place once completely written, an existing directory is a complete model
+    return os.path.isdir(model_dir)
+
+def save_model_dir(model_dir, save):
+    # save(path) writes the model into a temporary directory that is renamed at the end,
+    # so other processes never load a half written model
+    parent_dir = os.path.dirname(model_dir)
+    try:
+        os.makedirs(parent_dir, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent_dir, prefix=".tmp-")
+    except OSError as error:
+        warnings.warn(f"Can not write the model cache in {parent_dir}: {error}")
+        return False
+    try:
+        save(tmp_dir)
+        os.rename(tmp_dir, model_dir)
+    except OSError as error:
+        # Another process may have saved the same model first
+        if not is_cached(model_dir):
+            warnings.warn(f"Can not write the model cache in {model_dir}: {error}")
+            return False
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return True
@@ -0,0 +1,162 @@
+import argparse
+import http.client
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+import numpy as np
+from backends import registry, create_backends, TRANSLATOR, TRANSCRIBER, add_backend_arguments, check_backend_arguments
+from micro_batcher import Micro_batcher
+from translation_cache import Translation_cache, Cached_translator
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+class Model_server(ThreadingHTTPServer):
+    # Holds one copy of the models and serves every capture client
+    daemon_threads = True
+
+    def __init__(self, transcriber, translator, host=HOST, port=PORT, info=None):
+        super().__init__((host, port), Model_handler)
+        self.transcriber = transcriber
+        # Whisper can not transcribe several audios at once, requests take turns
+        self.transcriber_lock = threading.Lock()
+        # Translations of all clients go through the same cache and are batched together
+        self.translator = Cached_translator(translator, Translation_cache())
+        self.batcher = Micro_batcher(self.translator)
+        self.info = info or {}
+        self.info["model"] = self.translator.model_name
+        self.info["system_prompt"] = self.translator.system_prompt
+
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+class Model_handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, clients reuse their connection
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json({**self.server.info, "cache": self.server.translator.cache.stats()})
+        else:
+            self.send_json({"error": f"Unknown path {self.path}"}, 404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            if self.path == "/transcribe":
+                # Body is the float32 audio at 16 kHz
+                audio_np = np.frombuffer(body, dtype=np.float32)
+                with self.server.transcriber_lock:
+                    result = self.server.transcriber.transcribe(audio_np)
+                self.send_json({"text": result["text"]})
+            elif self.path == "/translate":
+                text = json.loads(body)["text"]
+                self.send_json({"translation": self.server.batcher.translate(text)})
+            elif self.path == "/translate_batch":
+                texts = json.loads(body)["texts"]
+                futures = [self.server.batcher.submit(text) for text in texts]
+                self.send_json({"translations": [future.result() for future in futures]})
+            elif self.path == "/translate_multi":
+                request = json.loads(body)
+                # One generate for every language, it does not mix with the batches of the other clients
+                with self.server.batcher.lock:
+                    translations = self.server.translator.translate_multi(request["text"], request["languages"])
+                self.send_json({"translations": translations})
+            else:
+                self.send_json({"error": f"Unknown path {self.path}"}, 404)
+        except Exception as exception:
+            self.send_json({"error": repr(exception)}, 500)
+
+class Model_client:
+    def __init__(self, url=f"http://{HOST}:{PORT}"):
+        parsed_url = urlparse(url)
+        self.host = parsed_url.hostname
+        self.port = parsed_url.port
+        # One persistent connection per thread
+        self.local = threading.local()
+
+    def request(self, method, path, body=None, content_type="application/json"):
+        for attempt in range(2):
+            connection = getattr(self.local, "connection", None)
+            if connection is None:
+                connection = http.client.HTTPConnection(self.host, self.port)
+                self.local.connection = connection
+            try:
+                connection.request(method, path, body=body, headers={"Content-Type": content_type})
+                response = connection.getresponse()
+                data = json.loads(response.read())
+                break
+            except (ConnectionError, http.client.HTTPException):
+                # The server closed the kept alive connection, open a new one once
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        if response.status != 200:
+            raise RuntimeError(f"Model server error: {data.get('error')}")
+        return data
+
+class Remote_transcriber(Model_client):
+    def __init__(self, url=f"http://{HOST}:{PORT}", **kwargs):
+        super().__init__(url)
+        self.model_size = self.request("GET", "/health").get("transcriber")
+
+    def transcribe(self, audio_np, fp16=None):
+        audio_np = np.ascontiguousarray(audio_np, dtype=np.float32)
+        return self.request("POST", "/transcribe", audio_np.tobytes(), "application/octet-stream")
+
+class Remote_translator(Model_client):
+    def __init__(self, url=f"http://{HOST}:{PORT}", **kwargs):
+        super().__init__(url)
+        info = self.request("GET", "/health")
+        # Same cache key as the model loaded in the server
+        self.model = info.get("model")
+        self.sistem_prompt = {"role": "system", "content": info.get("system_prompt", "")}
+
+    def translate(self, text):
+        return self.request("POST", "/translate", json.dumps({"text": text}).encode())["translation"]
+
+    def translate_batch(self, texts):
+        return self.request("POST", "/translate_batch", json.dumps({"texts": texts}).encode())["translations"]
+
+    def translate_multi(self, text, languages):
+        return self.request("POST", "/translate_multi", json.dumps({"text": text, "languages": languages}).encode())["translations"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the models once and serve transcriptions and translations on localhost")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--translator", default="qwen", choices=registry.names(TRANSLATOR))
+    parser.add_argument("--transcriber", default="whisper", choices=registry.names(TRANSCRIBER))
+    parser.add_argument("--whisper_model", default="small.en")
+    add_backend_arguments(parser)
+    args = parser.parse_args()
+    check_backend_arguments(parser, args)
+
+    print("Loading model...")
+    transcriber, translator = create_backends(args)
+    registry.report()
+
+    info = {"transcriber": args.whisper_model if args.transcriber == "whisper" else args.transcriber, "translator": args.translator}
+    server = Model_server(transcriber, translator, args.host, args.port, info)
+    print(f"Model server listening on {server.url()}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.batcher.stop()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,218 @@
+import argparse
+import subprocess
+import threading
+from backends import registry, create_backends, TRANSLATOR, TRANSCRIBER, add_backend_arguments, check_backend_arguments
+from audio_devices import device_cache, list_sink_devices, list_source_devices, get_device_name, is_source_available
+from translation_cache import Translation_cache, Cached_translator
+from incremental_translation import Incremental_transcript
+from stages import Transcription_stage, merge_translation_updates
+from pipeline import Pipeline, Stage_queue, DROP_OLDEST, DROP_STALE
+from audio_buffer import SAMPLE_RATE
+
+RECONNECT_SECONDS = 1.0
+MAX_RECONNECT_SECONDS = 30.0
+
+class Parec_capture(threading.Thread):
+    # Records a PulseAudio source, or the monitor of a sink, as 16 bit mono chunks of record_timeout seconds
+    def __init__(self, device_name, record_timeout, callback, sample_rate=SAMPLE_RATE, is_available=None):
+        super().__init__(name=f"capture {device_name}", daemon=True)
+        self.device_name = device_name
+        self.chunk_bytes = int(record_timeout * sample_rate) * 2
+        self.callback = callback
+        self.sample_rate = sample_rate
+        # is_available(device_name) tells if the device is back after parec exited, without it the capture ends with parec
+        self.is_available = is_available
+        self.stopped = threading.Event()
+        self.process = None
+
+    def run(self):
+        delay = RECONNECT_SECONDS
+        while not self.stopped.is_set():
+            # parec errors are not printed, a device that fails to open would write one every retry
+            self.process = subprocess.Popen(
+                ["parec", "-d", self.device_name, "--format=s16le", f"--rate={self.sample_rate}", "--channels=1", "--raw"],
+                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            )
+            received = False
+            while True:
+                data = self.process.stdout.read(self.chunk_bytes)
+                if not data:
+                    break
+                received = True
+                self.callback(data)
+            returncode = self.process.wait()
+            if self.is_available is None or self.stopped.is_set():
+                break
+            # A device that delivered audio was unplugged, one that did not may be listed but fail to open,
+            # or its remove event did not reach the device cache yet. Retries wait longer every time until audio arrives
+            if received:
+                print(f"\nCapture of {self.device_name} ended with status {returncode}, waiting for the device", flush=True)
+                delay = RECONNECT_SECONDS
+            self.stopped.wait(delay)
+            delay = min(MAX_RECONNECT_SECONDS, delay * 2)
+            while not self.stopped.is_set() and not self.is_available(self.device_name):
+                self.stopped.wait(RECONNECT_SECONDS)
+
+    def stop(self):
+        self.stopped.set()
+        if self.process is not None:
+            self.process.terminate()
+
+class Audio_stream:
+    def __init__(self, index, name, transcription_stage, translator):
+        self.index = index
+        self.name = name
+        # Every stream keeps its own phrase state and transcription, the models are shared
+        self.transcription_stage = transcription_stage
+        self.transcript = Incremental_transcript(translator)
+        # Capture never waits for the transcriber, if it falls behind the oldest audio is dropped
+        self.data_queue = Stage_queue(maxsize=64, policy=DROP_OLDEST)
+        self.capture = None
+
+def merge_stream_transcriptions(older, newer):
+    # A partial transcription is stale once a newer one of the same stream and phrase is queued
+    if older[0] != newer[0] or newer[1]["phrase_complete"]:
+        return None
+    return (newer[0], {**older[1], **newer[1], "phrase_complete": older[1]["phrase_complete"]})
+
+def merge_stream_updates(older, newer):
+    # Updates of the translated lines of every stream, merged per stream so no finished line is lost
+    merged = dict(older)
+    for index, update in newer.items():
+        merged[index] = merge_translation_updates(older[index], update) if index in older else update
+    return merged
+
+class Multi_stream_translator:
+    def __init__(self, transcriber, translator, queue_size=8, metrics=None):
+        self.transcriber = transcriber
+        self.translator = translator
+        self.streams = []
+        # Indices of the streams with new audio, the transcription stage serves them in turns
+        self.ready_queue = Stage_queue(maxsize=0)
+        self.next_stream = 0
+        self.translation_queue = Stage_queue(maxsize=queue_size, policy=DROP_STALE, merge=merge_stream_transcriptions)
+        self.output_queue = Stage_queue(maxsize=queue_size, policy=DROP_STALE, merge=merge_stream_updates)
+        self.pipeline = Pipeline(metrics)
+        # The transcription stage puts its results itself, one per stream, the queue only forwards the stop
+        self.pipeline.add_stage("transcription", self.transcribe, self.ready_queue, self.translation_queue, drain=True)
+        self.pipeline.add_stage("translation", self.translate, self.translation_queue, self.output_queue, drain=True)
+        self.pipeline.add_stage("output", self.output, self.output_queue)
+
+    def add_stream(self, name, **transcription_kwargs):
+        stream = Audio_stream(len(self.streams), name, Transcription_stage(self.transcriber, **transcription_kwargs), self.translator)
+        self.streams.append(stream)
+        return stream
+
+    def put_audio(self, stream, data):
+        stream.data_queue.put_item(data)
+        self.ready_queue.put_item(stream.index)
+
+    def transcribe(self, ready_indices):
+        # Round robin starting after the last stream served, so a busy stream can not starve the others
+        ready = set(ready_indices)
+        order = sorted(ready, key=lambda index: (index - self.next_stream) % len(self.streams))
+        for index in order:
+            stream = self.streams[index]
+            chunks = []
+            while not stream.data_queue.empty():
+                chunks.append(stream.data_queue.get_nowait())
+            if chunks:
+                result = stream.transcription_stage(chunks)
+                if result is not None:
+                    self.translation_queue.put_item((index, result))
+            self.next_stream = (index + 1) % len(self.streams)
+        return None
+
+    def translate(self, items):
+        # Updates of every stream are applied first, then all the lines waiting for a translation
+        # are translated with a single batched call
+        # Returns for every updated stream the index of its first changed line, the live line before the update
+        starts = {}
+        for index, item in items:
+            transcript = self.streams[index].transcript
+            start = len(transcript.transcription) - 1
+            if transcript.update_text(item["text"], item["phrase_complete"], item.get("completed", [])):
+                starts.setdefault(index, start)
+        pending = [(index, i) for index in starts for i in self.streams[index].transcript.pending()]
+        if pending:
+            texts = [self.streams[index].transcript.transcription[i] for index, i in pending]
+            for (index, i), translation in zip(pending, self.translator.translate_batch(texts)):
+                self.streams[index].transcript.set_translation(i, translation)
+        if not starts:
+            return None
+        return {index: (start, list(self.streams[index].transcript.lines(start))) for index, start in starts.items()}
+
+    def output(self, updates):
+        # The previous live line is printed again with its final text, then every line after it
+        for index, (_, lines) in updates.items():
+            stream = self.streams[index]
+            for line, translate_text in lines:
+                print(f"[{stream.name}] {line}\t\t{translate_text}", flush=True)
+
+    def start(self, record_timeout, is_available=None):
+        self.pipeline.start()
+        for stream in self.streams:
+            stream.capture = Parec_capture(stream.name, record_timeout, lambda data, stream=stream: self.put_audio(stream, data),
+                                           is_available=is_available)
+            stream.capture.start()
+
+    def stop(self):
+        for stream in self.streams:
+            if stream.capture is not None:
+                stream.capture.stop()
+        self.pipeline.stop()
+
+def get_monitor_name(sink_device):
+    return sink_device.get("Monitor Source") or f"{get_device_name(sink_device)}.monitor"
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe and translate several audio devices at once with one set of models")
+    parser.add_argument("--sink", type=int, action="append", default=[], help="Index of an output device to capture through its monitor, see --list-devices")
+    parser.add_argument("--source", type=int, action="append", default=[], help="Index of an input device to capture, see --list-devices")
+    parser.add_argument("--translator", default="qwen", choices=registry.names(TRANSLATOR))
+    parser.add_argument("--transcriber", default="whisper", choices=registry.names(TRANSCRIBER))
+    parser.add_argument("--whisper_model", default="small.en")
+    add_backend_arguments(parser)
+    parser.add_argument("--server", default=None, help="Use the models of a running model_server.py")
+    parser.add_argument("--record_timeout", type=float, default=2)
+    parser.add_argument("--phrase_timeout", type=float, default=3)
+    parser.add_argument("--max_window_seconds", type=float, default=30)
+    args = parser.parse_args()
+    check_backend_arguments(parser, args)
+
+    sink_devices_list = list_sink_devices()
+    source_devices_list = list_source_devices()
+    device_names = [get_monitor_name(sink_devices_list[index]) for index in args.sink]
+    device_names += [get_device_name(source_devices_list[index]) for index in args.source]
+    if not device_names:
+        print("Select at least one device with --sink or --source")
+        return 1
+    # The captures run for the whole session, the monitor keeps the device lists up to date for their reconnections
+    monitoring = device_cache.start_monitor()
+
+    print("Loading model...")
+    transcriber, translator = create_backends(args)
+    translator = Cached_translator(translator, Translation_cache())
+    registry.report()
+
+    multi_stream = Multi_stream_translator(transcriber, translator)
+    for device_name in device_names:
+        multi_stream.add_stream(device_name, phrase_timeout=args.phrase_timeout, max_window_seconds=args.max_window_seconds)
+    multi_stream.start(args.record_timeout, is_available=is_source_available if monitoring else None)
+    print("Recording...")
+    try:
+        while multi_stream.pipeline.is_alive():
+            multi_stream.pipeline.stages[-1].join(timeout=1)
+    except KeyboardInterrupt:
+        pass
+    multi_stream.stop()
+    device_cache.stop_monitor()
+
+    for stream in multi_stream.streams:
+        print(f"\n\nTranscription of {stream.name}:")
+        for line in stream.transcript.transcription:
+            print(line)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,149 @@
+import threading
+import warnings
+from time import perf_counter
+from queue import Queue, Full, Empty
+
+# Backpressure policies applied when a stage queue is full
+BLOCK = "block" # Wait until the next stage consumes an item
+DROP_OLDEST = "drop_oldest" # Discard the oldest queued item
+DROP_NEWEST = "drop_newest" # Discard the item being queued
+DROP_STALE = "drop_stale" # Merge an old item into the one queued after it, block if nothing can be merged
+BACKPRESSURE_POLICIES = [BLOCK, DROP_OLDEST, DROP_NEWEST, DROP_STALE]
+
+STOP = object() # Sentinel that shuts down every stage it goes through
+
+class Stage_queue(Queue):
+    def __init__(self, maxsize, policy=BLOCK, merge=None):
+        super().__init__(maxsize=maxsize)
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ValueError(f"Unknown backpressure policy '{policy}', use one of {BACKPRESSURE_POLICIES}")
+        if policy == DROP_STALE and merge is None:
+            raise ValueError(f"Backpressure policy '{DROP_STALE}' needs a merge function")
+        self.policy = policy
+        # merge(older, newer) returns an item that replaces both, or None if the older item can not be dropped
+        self.merge = merge
+        self.dropped = 0
+        self.merged = 0
+
+    def put_item(self, item):
+        if item is STOP or self.policy == BLOCK:
+            self.put(item)
+        elif self.policy == DROP_NEWEST:
+            try:
+                self.put_nowait(item)
+            except Full:
+                self.dropped += 1
+        elif self.policy == DROP_OLDEST:
+            while True:
+                try:
+                    self.put_nowait(item)
+                    return
+                except Full:
+                    try:
+                        self.get_nowait()
+                        self.dropped += 1
+                    except Empty:
+                        pass
+        elif self.policy == DROP_STALE:
+            if self.full():
+                self.merge_stale()
+            self.put(item)
+
+    def merge_stale(self):
+        with self.mutex:
+            for i in range(len(self.queue) - 1):
+                if self.queue[i] is STOP or self.queue[i + 1] is STOP:
+                    continue
+                merged = self.merge(self.queue[i], self.queue[i + 1])
+                if merged is not None:
+                    self.queue[i + 1] = merged
+                    del self.queue[i]
+                    self.merged += 1
+                    self.not_full.notify()
+                    return True
+        return False
+
+class Pipeline_stage(threading.Thread):
+    def __init__(self, name, function, input_queue, output_queue=None, drain=False, metrics=None, profile_window=None):
+        super().__init__(name=name, daemon=True)
+        self.function = function
+        self.input_queue = input_queue
+        self.output_queue = output_queue
+        # When drain is True the function receives every queued item at once instead of one by one
+        self.drain = drain
+        self.metrics = metrics
+        self.profile_window = profile_window
+
+    def call(self, items):
+        argument = items if self.drain else items[0]
+        if self.profile_window is not None:
+            return self.profile_window.run(self.function, argument)
+        return self.function(argument)
+
+    def get_items(self):
+        items = [self.input_queue.get()]
+        while self.drain and items[-1] is not STOP:
+            try:
+                items.append(self.input_queue.get_nowait())
+            except Empty:
+                break
+        return items
+
+    def run(self):
+        while True:
+            # Blocks until there is work, so an idle stage does not use any CPU
+            items = self.get_items()
+            stop = items[-1] is STOP
+            if stop:
+                items.pop()
+            if items:
+                start = perf_counter()
+                try:
+                    result = self.call(items)
+                except Exception as exception:
+                    # A failing item must not take the whole pipeline down
+                    warnings.warn(f"Stage '{self.name}' failed: {exception!r}")
+                    if self.metrics is not None:
+                        self.metrics.increment("stage_errors", stage=self.name)
+                    result = None
+                if self.metrics is not None:
+                    self.metrics.observe("stage", perf_counter() - start, stage=self.name)
+                    self.metrics.increment("stage_items", len(items), stage=self.name)
+                    if len(items) > 1:
+                        # Drained items are merged into a single call
+                        self.metrics.increment("stage_merged_items", len(items) - 1, stage=self.name)
+                if result is not None and self.output_queue is not None:
+                    self.output_queue.put_item(result)
+            if stop:
+                if self.output_queue is not None:
+                    self.output_queue.put_item(STOP)
+                return
+
+class Pipeline:
+    def __init__(self, metrics=None, profile_window=None):
+        self.stages = []
+        self.metrics = metrics
+        self.profile_window = profile_window
+
+    def add_stage(self, name, function, input_queue, output_queue=None, drain=False):
+        stage = Pipeline_stage(name, function, input_queue, output_queue, drain, self.metrics, self.profile_window)
+        self.stages.append(stage)
+        if self.metrics is not None:
+            self.metrics.register_gauge("queue_depth", input_queue.qsize, stage=name)
+            self.metrics.register_gauge("queue_dropped", lambda: input_queue.dropped, stage=name)
+            self.metrics.register_gauge("queue_merged", lambda: input_queue.merged, stage=name)
+        return stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def is_alive(self):
+        return any(stage.is_alive() for stage in self.stages)
+
+    def stop(self, timeout=None):
+        # The sentinel flows through the stages in order so queued work is finished first
+        if self.stages:
+            self.stages[0].input_queue.put_item(STOP)
+        for stage in self.stages:
+            stage.join(timeout)
@@ -1,28 +1,44 @@
 import platform
 import warnings
 import subprocess
-# import speech_recognition as sr
-# from queue import Queue
-from whisper_model import Whisper
-from translator import Translator
-# from llama_3_1_1B import Llama_3_1_1B
-# from datetime import datetime, timedelta
+import argparse
+import importlib.util
+from backends import registry, create_backends, TRANSLATOR, TRANSCRIBER, add_backend_arguments, check_backend_arguments
+from audio_devices import list_sink_devices, list_source_devices
+from translation_cache import Translation_cache, Cached_translator
+from stages import Transcription_stage, Translation_stage, merge_transcriptions, merge_translation_updates
+from metrics import Metrics, Profile_window
+from chunk_controller import Chunk_controller, get_model_ladder, TARGET_RTF, MIN_RECORD_TIMEOUT, MAX_RECORD_TIMEOUT
+from subtitle_renderer import Subtitle_renderer, Subtitle_writer, get_subtitle_path
+from languages import parse_languages
+from pipeline import Pipeline, Stage_queue, BLOCK, DROP_STALE, BACKPRESSURE_POLICIES
+from time import perf_counter
 # import numpy as np
-# import torch
 # import os
-# from time import sleep
 # import pyaudio
-from sink_device import Sink_device
-from source_device import Source_device
 
 LINUX = "linux"
 WINDOWS = "windows"
 MAC = "mac"
 
+DEPENDENCY_MESSAGES = {
+    "torch": "PyTorch not found. Please install PyTorch. Visit PyTorch website for installation instructions.",
+    "speech_recognition": "SpeechRecognition not found. Please install SpeechRecognition with 'pip install SpeechRecognition' or 'conda install conda-forge::speechrecognition'",
+    "numpy": "Numpy not found. Please install Numpy with 'pip install numpy' or 'conda install conda-forge::numpy'",
+    "pyaudio": "PyAudio not found. Please install PyAudio with 'pip install pyaudio' or 'conda install conda-forge::pyaudio'",
+    "setuptools": "Setuptools not found. Please install Setuptools with 'pip install setuptools' or 'conda install conda-forge::setuptools'",
+    "whisper": "Whisper not found. Please install Whisper with 'pip install git+https://github.com/openai/whisper.git'",
+    "transformers": "Transformers not found. Please install Transformers with 'pip install transformers'",
+    "huggingface_hub": "Huggingface Hub not found. Please install Huggingface Hub with 'pip install huggingface_hub'",
+    "dotenv": "Python-dotenv not found. Please install Python-dotenv with 'pip install python-dotenv'",
+    "safetensors": "Safetensors not found. Please install Safetensors with 'pip install safetensors'",
+    "ollama": "Ollama not found. Please install the Ollama python library with 'pip install ollama'",
+}
+
 def get_operating_system():
     return platform.system().lower()
 
-def check_for_dependencies(operating_system):
+def check_for_dependencies(operating_system, backends=(), device="auto"):
     # Check for system dependencies
     if operating_system == LINUX:
         # Check for pulseaudio
@@ -56,126 +72,98 @@ def check_for_dependencies(operating_system):
         pass
 
     # Check for python dependencies
-    # Check for pytorch
-    try:
+    # Only look for the packages, they are imported when the selected backends are first used
+    dependencies = ["speech_recognition", "numpy", "pyaudio", "setuptools"]
+    for backend in backends:
+        dependencies = registry.get(backend).dependencies + dependencies
+    for dependency in dict.fromkeys(dependencies):
+        if importlib.util.find_spec(dependency) is None:
+            warnings.warn(DEPENDENCY_MESSAGES.get(dependency, f"{dependency} not found. Please install {dependency}"))
+            return False
+
+    # Check if is cuda available, without it the models run on CPU
+    if "torch" in dependencies and device != "cpu":
         import torch
-    except ImportError:
-        warnings.warn("PyTorch not found. Please install PyTorch. Visit PyTorch website for installation instructions.")
-        return False
-    # Check if is cuda available
-    if not torch.cuda.is_available():
-        warnings.warn("CUDA not found in PyTorch installation. Please install PyTorch with CUDA support or install CUDA.")
-        return False
-    
-    # Check for SpeechRecognition
-    try:
-        import speech_recognition as sr
-    except ImportError:
-        warnings.warn("SpeechRecognition not found. Please install SpeechRecognition with 'pip install SpeechRecognition' or 'conda install conda-forge::speechrecognition'")
-        return False
-    
-    # Check for numpy
-    try:
-        import numpy as np
-    except ImportError:
-        warnings.warn("Numpy not found. Please install Numpy with 'pip install numpy' or 'conda install conda-forge::numpy'")
-        return False
-    
-    # Check for pyaudio
-    try:
-        import pyaudio
-    except ImportError:
-        warnings.warn("PyAudio not found. Please install PyAudio with 'pip install pyaudio' or 'conda install conda-forge::pyaudio'")
-        return False
-    
-    # Check for setuptools
-    try:
-        import setuptools
-    except ImportError:
-        warnings.warn("Setuptools not found. Please install Setuptools with 'pip install setuptools' or 'conda install conda-forge::setuptools'")
-        return False
-    
-    # Check for whisper
-    try:
-        import whisper
-    except ImportError:
-        warnings.warn("Whisper not found. Please install Whisper with 'pip install git+https://github.com/openai/whisper.git'")
-        return False
-    # TODO ollama
-    
-    return True
+        if not torch.cuda.is_available():
+            if device == "cuda":
+                warnings.warn("CUDA not found in PyTorch installation. Please install PyTorch with CUDA support or install CUDA.")
+                return False
+            warnings.warn("CUDA not found in PyTorch installation. Running on CPU, use --quantize to speed up inference.")
 
-def list_sink_devices(debug=False):
-    # Get output audio devices
-    result = subprocess.run(["pactl", "list", "sinks"], capture_output=True, text=True)
-    if result:
-        output = result.stdout
-        sink_devices_list = []
-        sink_device = None
-        for number_line, line in enumerate(output.split("\n")):
-            if "Sink #" in line or "Destino #" in line:
-                if sink_device: # If not the first device append the previous device to the list
-                    sink_devices_list.append(sink_device)
-                sink_device = {"id": line.split("#")[1]}
-                if debug: print(f"\tOutput device: {sink_device['id']}")
-                properties = 0
-                ports = 0
-                formats = 0
-            elif "Properties:" in line:
-                properties = 1
-                ports = 0
-                formats = 0
-                sink_device["properties"] = {}
-            elif "Ports:" in line:
-                properties = 0
-                ports = 1
-                formats = 0
-                sink_device["ports"] = {}
-            elif "Formats:" in line:
-                properties = 0
-                ports = 0
-                formats = 1
-                sink_device["formats"] = {}
-            else:
-                key = line.split(":")[0].strip()
-                if "balance" in key:
-                    key = "balance"
-                    value = line.split("balance")[1]
-                else:
-                    value = line.split(":")[1:]
-
-                # if value is a list, join it
-                if type(value) == list:
-                    value = "".join(value).strip()
-                else:
-                    value = value.strip()
-
-                if properties:
-                    sink_device["properties"][key] = value
-                elif ports:
-                    sink_device["ports"][key] = value
-                elif formats:
-                    if key != "":
-                        sink_device["formats"][key] = value
-                else:
-                    sink_device[key] = value
-            
-            if number_line == len(output.split("\n")) - 1:
-                sink_devices_list.append(sink_device)
-
-    return sink_devices_list
+    return True
 
 def list_microphones():
+    import speech_recognition as sr
     microphones_list = [{"id": i, "name": name} for i, name in enumerate(sr.Microphone.list_microphone_names())]
     return microphones_list
 
+def list_devices():
+    print("Output devices:")
+    for i, device in enumerate(list_sink_devices()):
+        print(f"\t{i:02}. {device.get('Description', device.get('Descripción'))}")
+    print("Input devices:")
+    for i, device in enumerate(list_source_devices()):
+        print(f"\t{i:02}. {device.get('Description', device.get('Descripción'))}")
+    if importlib.util.find_spec("speech_recognition") is not None:
+        print("Microphones:")
+        for microphone in list_microphones():
+            print(f"\t{microphone['id']:02}. {microphone['name']}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Real time transcription and translation")
+    parser.add_argument("--list-devices", action="store_true", help="List the audio devices and exit")
+    parser.add_argument("--translator", default="qwen", choices=registry.names(TRANSLATOR), help="Translation backend")
+    parser.add_argument("--transcriber", default="whisper", choices=registry.names(TRANSCRIBER), help="Transcription backend")
+    parser.add_argument("--whisper_model", default="small.en", help="Whisper model size")
+    parser.add_argument("--server", default=None, help="Use the models of a running model_server.py, e.g. http://127.0.0.1:8765")
+    add_backend_arguments(parser)
+    parser.add_argument("--translation_cache", default=None, help="File to persist the translation cache across restarts, e.g. translation_cache.json")
+    parser.add_argument("--record_timeout", type=float, default=2, help="Seconds of audio in each recorded chunk")
+    parser.add_argument("--phrase_timeout", type=float, default=3, help="Seconds of silence between recordings to consider a new phrase")
+    parser.add_argument("--no_incremental", action="store_true", help="Retranslate the whole transcription on every update")
+    parser.add_argument("--max_window_seconds", type=float, default=30, help="Maximum seconds of audio sent to the transcriber")
+    parser.add_argument("--no_vad", action="store_true", help="Split phrases with phrase_timeout instead of voice activity detection")
+    parser.add_argument("--energy_threshold", type=int, default=1000, help="Energy level for the microphone to detect")
+    parser.add_argument("--backpressure", default=DROP_STALE, choices=BACKPRESSURE_POLICIES, help="Policy for transcriptions waiting to be translated")
+    parser.add_argument("--queue_size", type=int, default=4, help="Size of the queues between pipeline stages")
+    parser.add_argument("--adaptive", action="store_true", help="Adapt record_timeout and the Whisper model size to keep the real time factor below --target_rtf")
+    parser.add_argument("--target_rtf", type=float, default=TARGET_RTF, help="Target real time factor of transcription plus translation")
+    parser.add_argument("--min_record_timeout", type=float, default=MIN_RECORD_TIMEOUT, help="Shortest chunk the adaptive controller uses")
+    parser.add_argument("--max_record_timeout", type=float, default=MAX_RECORD_TIMEOUT, help="Longest chunk the adaptive controller uses")
+    parser.add_argument("--stream_translation", action="store_true", help="Show the translation of the live line while it is generated")
+    parser.add_argument("--target_languages", default=None, help="Comma separated languages to translate every line to in one pass, e.g. es,fr. Subtitle files get one track per language")
+    parser.add_argument("--srt", default=None, help="SRT file to write the translated subtitles to")
+    parser.add_argument("--vtt", default=None, help="WebVTT file to write the translated subtitles to")
+    parser.add_argument("--metrics_port", type=int, default=None, help="Serve Prometheus metrics at http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics_jsonl", default=None, help="File to append metrics snapshots to, one JSON object per line")
+    parser.add_argument("--metrics_interval", type=float, default=10, help="Seconds between metrics snapshots in the JSONL file")
+    parser.add_argument("--profile", type=float, default=None, help="Profile the pipeline stages for this many seconds")
+    parser.add_argument("--profile_start", type=float, default=0, help="Seconds to wait after start before profiling")
+    parser.add_argument("--profile_output", default="real_time_translator.prof", help="File for the cProfile stats")
+    args = parser.parse_args()
+    check_backend_arguments(parser, args)
+    return args
+
 def main():
+    start_time = perf_counter()
+    args = parse_args()
+
     # Get operating system
     operating_system = get_operating_system()
     print(f"Operating System: {operating_system}")
 
+    if args.list_devices:
+        list_devices()
+        print(f"Listed devices in {perf_counter() - start_time:.2f}s")
+        return 0
+
+    # With a model server the models are loaded once in the server and this process is a thin client
+    if args.server:
+        args.transcriber = "remote_transcriber"
+        args.translator = "remote_translator"
+
     # Check for dependencies
-    if not check_for_dependencies(operating_system):
+    if not check_for_dependencies(operating_system, [args.transcriber, args.translator], args.device):
         warnings.warn("Dependencies not met. Exiting...")
         return 1
     
@@ -210,19 +198,50 @@ def main():
     #         print(f"Source device selected: {source_device.source_device['Description']}, id: {source_device.source_device['id']}")
     #         select_source = True
     
-    # Load transcriber and translate model
+    # Load transcriber and translate model, their modules are imported here for the first time
     print("Loading model...")
-    # transcriber = Whisper(model_size="small.en")
-    translator = Translator()
-    print("Model loaded.")
-    translate_text = translator.translate("Hello, how are you?")
-    print(f"Translated text: {translate_text}")
-    return 0
+    transcriber, translator = create_backends(args)
+    translation_cache = Translation_cache(path=args.translation_cache)
+    translator = Cached_translator(translator, translation_cache)
+    registry.report()
+
+    import speech_recognition as sr
+    recorder = sr.Recognizer()
+    recorder.energy_threshold = args.energy_threshold
+    # Dynamic energy compensation lowers the energy threshold so much that the recorder never stops recording
+    recorder.dynamic_energy_threshold = False
+    source = sr.Microphone(sample_rate=16000)
+
+    transcription_stage = Transcription_stage(transcriber, use_vad=not args.no_vad, phrase_timeout=args.phrase_timeout, max_window_seconds=args.max_window_seconds)
+    target_languages = parse_languages(args.target_languages)
 
-    record_timeout = 2 # TODO args.record_timeout
-    phrase_timeout = 3 # TODO args.phrase_timeout
+    # Bounded queues between the capture, transcription, translation and output stages
+    data_queue = Stage_queue(maxsize=64, policy=BLOCK)
+    transcription_queue = Stage_queue(maxsize=args.queue_size, policy=args.backpressure, merge=merge_transcriptions)
+    # Updates only carry the changed lines, so they are merged instead of dropped
+    output_queue = Stage_queue(maxsize=args.queue_size, policy=DROP_STALE, merge=merge_translation_updates)
+    # Partial translations of the live line go straight to the output stage, they are merged like any update
+    on_partial = output_queue.put_item if args.stream_translation else None
+    translation_stage = Translation_stage(translator, incremental=not args.no_incremental, target_languages=target_languages, on_partial=on_partial)
 
-    transcription = ['']
+    # Prints finished lines once, redraws the live line and streams the translations to subtitle files
+    writers = [Subtitle_writer(get_subtitle_path(path, language), language=language)
+               for path in (args.srt, args.vtt) if path
+               for language in (target_languages or [None])]
+    renderer = Subtitle_renderer(writers)
+
+    # Stage timers, queue depths and dropped or merged items, exported as Prometheus text or JSONL
+    metrics = Metrics()
+    if args.metrics_port:
+        metrics.serve(args.metrics_port)
+    if args.metrics_jsonl:
+        metrics.start_jsonl(args.metrics_jsonl, args.metrics_interval)
+    profile_window = Profile_window(args.profile, args.profile_output, args.profile_start) if args.profile else None
+
+    pipeline = Pipeline(metrics, profile_window)
+    pipeline.add_stage("transcription", transcription_stage, data_queue, transcription_queue, drain=True)
+    pipeline.add_stage("translation", translation_stage, transcription_queue, output_queue)
+    pipeline.add_stage("output", renderer, output_queue)
 
     with source:
         recorder.adjust_for_ambient_noise(source)
@@ -234,70 +253,69 @@ def main():
         """
         # Grab the raw bytes and push it into the thread safe queue.
         data = audio.get_raw_data()
-        data_queue.put(data)
+        metrics.increment("captured_chunks")
+        metrics.increment("captured_bytes", len(data))
+        with metrics.timer("capture"):
+            data_queue.put_item(data)
 
     # Create a background thread that will pass us raw audio bytes.
     # We could do this manually but SpeechRecognizer provides a nice helper.
-    recorder.listen_in_background(source, record_callback, phrase_time_limit=record_timeout)
+    renderer.start()
+    pipeline.start()
+    stop_listening = recorder.listen_in_background(source, record_callback, phrase_time_limit=args.record_timeout)
 
     # Cue the user that we're ready to go.
     print("Model loaded.\n")
+    print("Recording...")
+
+    def restart_recorder(record_timeout):
+        # listen_in_background reads phrase_time_limit once, a new chunk length needs a new listener
+        nonlocal stop_listening
+        stop_listening(wait_for_stop=True)
+        stop_listening = recorder.listen_in_background(source, record_callback, phrase_time_limit=record_timeout)
+
+    controller = None
+    if args.adaptive:
+        controller_kwargs = {}
+        if args.transcriber == "whisper":
+            controller_kwargs["model_ladder"] = get_model_ladder(args.whisper_model)
+            controller_kwargs["load_transcriber"] = lambda model_size: registry.create(
+                "whisper", model_size=model_size, device=args.device, quantize=args.quantize, use_model_cache=not args.no_model_cache)
+        controller = Chunk_controller(transcription_stage, translation_stage, args.record_timeout, restart_recorder,
+                                      target_rtf=args.target_rtf, min_record_timeout=args.min_record_timeout,
+                                      max_record_timeout=args.max_record_timeout, metrics=metrics, **controller_kwargs)
 
-    print_start = True
-
-    while True:
-        if print_start:
-            print("Recording...")
-            print_start = False
-        try:
-            now = datetime.utcnow()
-            # Pull raw recorded audio from the queue.
-            if not data_queue.empty():
-                phrase_complete = False
-                # If enough time has passed between recordings, consider the phrase complete.
-                # Clear the current working audio buffer to start over with the new data.
-                if phrase_time and now - phrase_time > timedelta(seconds=phrase_timeout):
-                    phrase_complete = True
-                # This is the last time we received new audio data from the queue.
-                phrase_time = now
-
-                # Combine audio data from queue
-                audio_data = b''.join(data_queue.queue)
-                data_queue.queue.clear()
-                
-                # Convert in-ram buffer to something the model can use directly without needing a temp file.
-                # Convert data from 16 bit wide integers to floating point with a width of 32 bits.
-                # Clamp the audio stream frequency to a PCM wavelength compatible default of 32768hz max.
-                audio_np = np.frombuffer(audio_data, dtype=np.int16).astype(np.float32) / 32768.0
-
-                # Read the transcription.
-                result = transcriber.transcribe(audio_np, fp16=torch.cuda.is_available())
-                text = result['text'].strip()
-
-                # If we detected a pause between recordings, add a new item to our transcription.
-                # Otherwise edit the existing one.
-                if phrase_complete:
-                    transcription.append(text)
-                else:
-                    transcription[-1] = text
-
-                # Clear the console to reprint the updated transcription.
-                # os.system('cls' if os.name=='nt' else 'clear')
-                for line in transcription:
-                    translate_text = translator.translate(line)
-                    print(f"{line}\t\t{translate_text}")
-                # Flush stdout.
-                print('', end='', flush=True)
-            else:
-                # Infinite loops are bad for processors, must sleep.
-                sleep(0.001)
-        except KeyboardInterrupt:
-            break
+    # Every stage blocks on its queue, the main thread only waits for Ctrl+C and runs the chunk controller
+    try:
+        while pipeline.is_alive():
+            pipeline.stages[-1].join(timeout=1)
+            if controller is not None:
+                controller.tick()
+    except KeyboardInterrupt:
+        pass
+    stop_listening(wait_for_stop=False)
+    pipeline.stop()
+    renderer.close()
+    metrics.stop()
+    if profile_window is not None:
+        profile_window.dump()
 
     print("\n\nTranscription:")
-    for line in transcription:
+    for line in translation_stage.transcription:
         print(line)
 
+    translation_cache.save()
+    print(f"Translation cache: {translation_cache.stats()}")
+    # A real time factor above 1 means the stage is slower than the incoming audio
+    audio_seconds = transcription_stage.audio_seconds
+    if audio_seconds:
+        print(f"Real time factor: transcription {transcription_stage.busy_seconds / audio_seconds:.2f}, translation {translation_stage.busy_seconds / audio_seconds:.2f}")
+    if controller is not None:
+        print(f"Chunk controller: {len(controller.decisions)} decisions, record_timeout {controller.record_timeout}s"
+              + (f", model {controller.model_ladder[controller.model_index]}" if controller.model_ladder else ""))
+    print(f"Dropped items: {transcription_queue.dropped}, merged transcriptions: {transcription_queue.merged}, merged output updates: {output_queue.merged}")
+    return 0
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    exit(main())
\ No newline at end of file
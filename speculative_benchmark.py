@@ -0,0 +1,94 @@
+import argparse
+import json
+from time import perf_counter
+from translator import Translator, DRAFT_CHECKPOINTS
+from benchmark import get_percentiles
+
+# Subtitle length sentences, from a couple of words to a full two line subtitle
+SENTENCES = [
+    "Hello everyone.",
+    "Thanks for watching.",
+    "Let's get started with today's video.",
+    "Can you hear me now?",
+    "I think we should wait a little bit longer.",
+    "This is the most important part of the whole process.",
+    "If you have any questions, leave them in the comments below.",
+    "The model runs on the graphics card, so it is much faster than on the processor.",
+    "We are going to see how to install it step by step on a fresh machine.",
+    "Don't forget to subscribe and hit the bell to get notified of new videos.",
+]
+
+def load_sentences(path):
+    if path is None:
+        return SENTENCES
+    with open(path, "r", encoding="utf-8") as file:
+        return [line.strip() for line in file if line.strip()]
+
+def time_translations(translator, sentences, repeats):
+    latencies = []
+    translations = []
+    for sentence in sentences:
+        best = None
+        for _ in range(repeats):
+            start = perf_counter()
+            translation = translator.translate(sentence)
+            elapsed = perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        latencies.append(best)
+        translations.append(translation)
+    return latencies, translations
+
+def main():
+    parser = argparse.ArgumentParser(description="Per sentence latency of the translator with and without a speculative decoding draft model")
+    parser.add_argument("--draft_model", default=DRAFT_CHECKPOINTS)
+    parser.add_argument("--sentences", default=None, help="Text file with one sentence per line, by default a built in list of subtitles")
+    parser.add_argument("--device", default="auto", choices=["auto", "cuda", "cpu"])
+    parser.add_argument("--repeats", type=int, default=3, help="Every sentence is translated this many times and the fastest is kept")
+    parser.add_argument("--output", default=None, help="JSON file to write the results to")
+    args = parser.parse_args()
+
+    sentences = load_sentences(args.sentences)
+    print("Loading model...")
+    # Both runs decode greedily, so the draft must not change any translation. Assisted generation can not use
+    # the prefix cache, so the baseline does not use it either and the draft model is the only difference
+    translator = Translator(use_prefix_cache=False, device=args.device, draft_checkpoints=args.draft_model, greedy=True)
+    translator.use_draft = False
+    translator.translate(sentences[0]) # Warm up
+    baseline_latencies, baseline_translations = time_translations(translator, sentences, args.repeats)
+    translator.use_draft = True
+    translator.translate(sentences[0])
+    draft_latencies, draft_translations = time_translations(translator, sentences, args.repeats)
+
+    segments = []
+    for sentence, baseline_latency, draft_latency, baseline_translation, draft_translation in zip(
+            sentences, baseline_latencies, draft_latencies, baseline_translations, draft_translations):
+        segments.append({
+            "sentence": sentence,
+            "baseline_seconds": baseline_latency,
+            "draft_seconds": draft_latency,
+            "speedup": baseline_latency / draft_latency,
+            "same_output": baseline_translation == draft_translation,
+            "translation": baseline_translation,
+        })
+        print(f"{baseline_latency * 1000:7.1f}ms {draft_latency * 1000:7.1f}ms x{baseline_latency / draft_latency:.2f}"
+              f"{'' if baseline_translation == draft_translation else ' DIFFERENT OUTPUT'}\t{sentence}")
+
+    results = {
+        "config": vars(args),
+        "baseline": get_percentiles(baseline_latencies),
+        "draft": get_percentiles(draft_latencies),
+        "speedup": get_percentiles([segment["speedup"] for segment in segments]),
+        "same_output": all(segment["same_output"] for segment in segments),
+        "segments": segments,
+    }
+    print(f"Median speedup: x{results['speedup']['p50']:.2f}, mean: x{results['speedup']['mean']:.2f}")
+    if not results["same_output"]:
+        print("Warning: some translations with the draft model are different from the greedy output of the main model")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,197 @@
+from datetime import datetime, timedelta
+from time import perf_counter
+from audio_buffer import Audio_ring_buffer, SAMPLE_RATE
+from voice_activity_detector import Voice_activity_detector
+from incremental_translation import Incremental_transcript
+
+class Transcription_stage:
+    def __init__(self, transcriber, use_vad=True, phrase_timeout=3, max_window_seconds=30, sample_rate=SAMPLE_RATE, clock=datetime.utcnow):
+        self.transcriber = transcriber
+        self.use_vad = use_vad
+        self.phrase_timeout = phrase_timeout
+        self.sample_rate = sample_rate
+        # The clock decides when a phrase times out, replays use the position in the audio file instead of the wall clock
+        self.clock = clock
+        # Drops silence before Whisper and marks the end of each utterance
+        self.vad = Voice_activity_detector(sample_rate=sample_rate)
+        self.phrase_ended = False
+        self.phrase_time = None
+        # Audio of the current phrase, Whisper never receives more than max_window_seconds
+        self.audio_buffer = Audio_ring_buffer(max_window_seconds=max_window_seconds, sample_rate=sample_rate)
+        # Audio written since the last transcription, and final texts of the phrases ended in the current call
+        self.untranscribed = False
+        self.completed = []
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+        self.latencies = []
+
+    def __call__(self, chunks):
+        start = perf_counter()
+        result = self.transcribe(chunks)
+        elapsed = perf_counter() - start
+        self.busy_seconds += elapsed
+        if result is not None:
+            self.latencies.append(elapsed)
+        return result
+
+    def transcribe_buffer(self):
+        self.untranscribed = False
+        result = self.transcriber.transcribe(self.audio_buffer.view())
+        return result['text'].strip()
+
+    def end_phrase(self):
+        # Audio not transcribed yet would be lost with the buffer, so it is transcribed first.
+        # None means the text already sent for the phrase is final
+        if self.audio_buffer.length:
+            self.completed.append(self.transcribe_buffer() if self.untranscribed else None)
+        self.audio_buffer.clear()
+
+    def write_audio(self, data):
+        # A phrase longer than the window ends here instead of sliding the window, so its start is never lost
+        if self.audio_buffer.length and self.audio_buffer.length + len(data) // 2 > self.audio_buffer.capacity:
+            self.end_phrase()
+        self.audio_buffer.write(data)
+        self.untranscribed = True
+
+    def transcribe(self, chunks):
+        # 16 bit mono audio
+        self.audio_seconds += sum(len(data) for data in chunks) / (2 * self.sample_rate)
+        self.completed = []
+        phrase_complete = False
+        now = self.clock()
+        # If enough time has passed between recordings, consider the phrase complete.
+        phrase_timed_out = self.phrase_time is not None and now - self.phrase_time > timedelta(seconds=self.phrase_timeout)
+        # This is the last time we received new audio data from the queue.
+        self.phrase_time = now
+        if self.use_vad:
+            # Silence and noise never reach Whisper, utterance boundaries come from the VAD.
+            # The recorder does not deliver audio while it is quiet, so a long gap also ends the utterance
+            if phrase_timed_out:
+                self.phrase_ended = True
+            has_speech = False
+            for data in chunks:
+                chunk_has_speech, utterance_end = self.vad.process(data)
+                if chunk_has_speech:
+                    if self.phrase_ended:
+                        phrase_complete = True
+                        self.phrase_ended = False
+                        self.end_phrase()
+                    self.write_audio(data)
+                    has_speech = True
+                if utterance_end:
+                    self.phrase_ended = True
+            if not has_speech:
+                return None
+        else:
+            # Clear the current working audio buffer to start over with the new data.
+            phrase_complete = phrase_timed_out
+
+            # Start a new audio window when the phrase is complete
+            if phrase_complete:
+                self.end_phrase()
+
+            # Convert the queued 16 bit frames into the float32 ring buffer in place
+            for data in chunks:
+                self.write_audio(data)
+
+        # Read the transcription.
+        text = self.transcribe_buffer()
+        if not self.completed:
+            return {"text": text, "phrase_complete": phrase_complete}
+        # Lines ended in this call, the first one is the live line and the rest are new lines before the text
+        return {"text": text, "phrase_complete": True, "completed": self.completed}
+
+class Multi_target_translator:
+    # Translates every line to all the target languages at once, a translation is a dict keyed by language
+    def __init__(self, translator, languages):
+        self.translator = translator
+        self.languages = list(languages)
+
+    def translate(self, text):
+        if not text.strip():
+            return {language: "" for language in self.languages}
+        return self.translator.translate_multi(text, self.languages)
+
+    def translate_batch(self, texts):
+        return [self.translate(text) for text in texts]
+
+class Translation_stage:
+    def __init__(self, translator, incremental=True, target_languages=None, on_partial=None):
+        if target_languages:
+            translator = Multi_target_translator(translator, target_languages)
+        self.translator = translator
+        self.incremental = incremental
+        # In incremental mode completed phrases keep their translation and only the live line is retranslated
+        empty_translation = {language: "" for language in target_languages} if target_languages else ""
+        self.transcript = Incremental_transcript(translator, empty_translation)
+        self.transcription = self.transcript.transcription if incremental else ['']
+        # on_partial(update) receives the live line while its translation is generated, so the display
+        # updates before generation ends. Only used in incremental mode with a translator that streams
+        self.on_partial = on_partial if hasattr(translator, "translate_stream") else None
+        self.busy_seconds = 0.0
+        self.latencies = []
+
+    def __call__(self, item):
+        start = perf_counter()
+        lines = self.translate(item)
+        elapsed = perf_counter() - start
+        self.busy_seconds += elapsed
+        if lines is not None:
+            self.latencies.append(elapsed)
+        return lines
+
+    def translate(self, item):
+        # If we detected a pause between recordings, add a new item to our transcription.
+        # Otherwise edit the existing one.
+        # Returns the index of the first changed line and the lines from there, the previous live line
+        # and the new one, so the output does not depend on the length of the transcription
+        text, phrase_complete, completed = item["text"], item["phrase_complete"], item.get("completed", [])
+        if self.incremental:
+            start = len(self.transcript.transcription) - 1
+            if self.on_partial is None:
+                if not self.transcript.update(text, phrase_complete, completed):
+                    return None
+                return start, list(self.transcript.lines(start))
+            if not self.transcript.update_text(text, phrase_complete, completed):
+                return None
+            for i in self.transcript.pending():
+                if i == len(self.transcript.transcription) - 1:
+                    translation = self.translate_stream(start, i)
+                else:
+                    translation = self.translator.translate(self.transcript.transcription[i])
+                self.transcript.set_translation(i, translation)
+            return start, list(self.transcript.lines(start))
+        if phrase_complete:
+            for i, line in enumerate(completed):
+                if i:
+                    self.transcription.append(line)
+                elif line is not None:
+                    self.transcription[-1] = line
+            self.transcription.append(text)
+        else:
+            self.transcription[-1] = text
+        return 0, list(zip(self.transcription, self.translator.translate_batch(self.transcription)))
+
+    def translate_stream(self, start, index):
+        line = self.transcript.transcription[index]
+        parts = []
+        for part in self.translator.translate_stream(line):
+            parts.append(part)
+            lines = list(self.transcript.lines(start))
+            lines[-1] = (line, "".join(parts).strip())
+            self.on_partial((start, lines))
+        return "".join(parts).strip()
+
+def merge_transcriptions(older, newer):
+    # A partial transcription is stale once a newer one of the same phrase is queued
+    if newer["phrase_complete"]:
+        return None
+    # The lines completed by the older item are kept
+    return {**older, **newer, "phrase_complete": older["phrase_complete"]}
+
+def merge_translation_updates(older, newer):
+    # Two updates of the translated lines are one update from the first changed line, so no finished line is lost
+    (older_start, older_lines), (newer_start, newer_lines) = older, newer
+    if newer_start <= older_start:
+        return newer
+    return older_start, older_lines[:newer_start - older_start] + newer_lines
@@ -0,0 +1,44 @@
+from time import sleep
+
+SAMPLE_RATE = 16000
+WORDS_PER_SECOND = 2.5 # Average speaking rate
+STUB_WORDS = "the quick brown fox jumps over the lazy dog".split()
+
+class Stub_transcriber:
+    # Stands in for Whisper in benchmarks and tests, the text length follows the audio length
+    def __init__(self, model_size="stub", delay=0.0, **kwargs):
+        self.model_size = model_size
+        # Seconds of processing per second of audio
+        self.delay = delay
+
+    def transcribe(self, audio_np, fp16=None):
+        seconds = len(audio_np) / SAMPLE_RATE
+        sleep(seconds * self.delay)
+        num_words = int(seconds * WORDS_PER_SECOND)
+        text = " ".join(STUB_WORDS[i % len(STUB_WORDS)] for i in range(num_words))
+        return {"text": text}
+
+class Stub_translator:
+    # Stands in for the translators in benchmarks and tests, echoes the text
+    def __init__(self, delay=0.0, **kwargs):
+        self.model = "stub"
+        # Seconds of processing per word
+        self.delay = delay
+
+    def translate(self, text):
+        sleep(len(text.split()) * self.delay)
+        return f"[es] {text}"
+
+    def translate_stream(self, text):
+        yield "[es]"
+        for word in text.split():
+            sleep(self.delay)
+            yield f" {word}"
+
+    def translate_batch(self, texts):
+        sleep(max((len(text.split()) for text in texts), default=0) * self.delay)
+        return [f"[es] {text}" for text in texts]
+
+    def translate_multi(self, text, languages):
+        sleep(len(text.split()) * self.delay)
+        return {language: f"[{language}] {text}" for language in languages}
@@ -0,0 +1,147 @@
+import os
+import queue
+import shutil
+import sys
+import threading
+from time import perf_counter
+
+SRT = "srt"
+VTT = "vtt"
+MIN_CUE_SECONDS = 1.0
+CLEAR_LINE = "\r\x1b[2K"
+
+def format_timestamp(seconds, separator=","):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02}:{minutes:02}:{seconds:02}{separator}{milliseconds:03}"
+
+def format_cue(number, start, end, text, subtitle_format=SRT):
+    # SRT numbers its cues and uses a comma before the milliseconds, WebVTT a dot
+    if subtitle_format == VTT:
+        return f"{format_timestamp(start, '.')} --> {format_timestamp(end, '.')}\n{text}\n\n"
+    return f"{number}\n{format_timestamp(start)} --> {format_timestamp(end)}\n{text}\n\n"
+
+def get_subtitle_path(path, language=None):
+    # One file per language, "movie.srt" becomes "movie.es.srt"
+    if language is None:
+        return path
+    root, extension = os.path.splitext(path)
+    return f"{root}.{language}{extension}"
+
+def format_translation(translation):
+    # Translations to several languages are dicts keyed by language
+    if isinstance(translation, dict):
+        return "\t".join(f"[{language}] {text}" for language, text in translation.items())
+    return translation
+
+class Subtitle_writer(threading.Thread):
+    # Cues are formatted and written in this thread, the output stage only puts them in a queue
+    def __init__(self, path, subtitle_format=None, language=None):
+        super().__init__(name=f"subtitles {path}", daemon=True)
+        self.path = path
+        self.subtitle_format = subtitle_format or (VTT if path.lower().endswith(".vtt") else SRT)
+        # Language of the track when the translations are dicts keyed by language
+        self.language = language
+        self.queue = queue.Queue()
+        self.num_cues = 0
+
+    def get_text(self, translation):
+        if isinstance(translation, dict):
+            return translation.get(self.language, "")
+        return translation
+
+    def add(self, start, end, text):
+        self.queue.put((start, end, text))
+
+    def run(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            if self.subtitle_format == VTT:
+                file.write("WEBVTT\n\n")
+            stop = False
+            while not stop:
+                # Every cue already queued goes through the file buffer, which is flushed once the queue is empty
+                cues = [self.queue.get()]
+                while not self.queue.empty():
+                    cues.append(self.queue.get_nowait())
+                for cue in cues:
+                    if cue is None:
+                        stop = True
+                        break
+                    self.num_cues += 1
+                    file.write(format_cue(self.num_cues, *cue, self.subtitle_format))
+                file.flush()
+
+    def stop(self):
+        self.queue.put(None)
+        self.join()
+
+class Subtitle_renderer:
+    # Finished lines are printed once and only the live line is redrawn in place,
+    # so an update costs the same at the start of the session and after hours
+    def __init__(self, writers=(), stream=None, clock=perf_counter):
+        self.writers = list(writers)
+        self.stream = stream or sys.stdout
+        # Redirected output gets only the finished lines
+        self.is_terminal = self.stream.isatty()
+        self.clock = clock
+        self.start_time = clock()
+        self.num_finished = 0
+        self.live_index = -1
+        self.live_start = 0.0
+        self.live_line = None
+        self.live_drawn = False
+
+    def start(self):
+        for writer in self.writers:
+            writer.start()
+
+    def __call__(self, update):
+        # update is the index of the first changed line and the lines from there to the live line
+        start, lines = update
+        now = self.clock() - self.start_time
+        live_index = start + len(lines) - 1
+        for index in range(max(start, self.num_finished), live_index):
+            # The cue of a line lasts until the next line appears
+            self.finish(lines[index - start], self.live_start if index == self.live_index else now, now)
+        self.num_finished = max(self.num_finished, live_index)
+        if live_index != self.live_index:
+            self.live_index = live_index
+            self.live_start = now
+        self.live_line = lines[-1]
+        self.draw_live()
+
+    def finish(self, line, start, end):
+        transcription, translation = line
+        if not transcription:
+            return
+        self.clear_live()
+        self.stream.write(f"{transcription}\t\t{format_translation(translation)}\n")
+        for writer in self.writers:
+            text = writer.get_text(translation)
+            if text:
+                writer.add(start, max(end, start + MIN_CUE_SECONDS), text)
+
+    def clear_live(self):
+        if self.live_drawn:
+            self.stream.write(CLEAR_LINE)
+            self.live_drawn = False
+
+    def draw_live(self):
+        if self.is_terminal:
+            transcription, translation = self.live_line
+            # A wrapped line could not be redrawn with a carriage return, it is cut to the terminal width
+            text = f"{transcription}\t\t{format_translation(translation)}".expandtabs()[:shutil.get_terminal_size().columns - 1]
+            self.stream.write(CLEAR_LINE + text)
+            self.live_drawn = True
+        self.stream.flush()
+
+    def close(self):
+        # The live line is final once the session ends
+        if self.live_line is not None and self.live_index >= self.num_finished:
+            self.finish(self.live_line, self.live_start, self.clock() - self.start_time)
+            self.num_finished = self.live_index + 1
+        self.stream.flush()
+        for writer in self.writers:
+            writer.stop()
@@ -0,0 +1,92 @@
+import os
+from audio_devices import parse_pactl_list, parse_pactl_json, get_device_name, Device_cache, SINKS, SOURCES
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as file:
+        return file.read()
+
+def test_parse_pactl_list_sinks():
+    devices = parse_pactl_list(read_fixture("pactl_list_sinks.txt"))
+    assert [device["id"] for device in devices] == ["0", "3"]
+    sink = devices[0]
+    assert sink["Name"] == "alsa_output.pci-0000_00_1f.3.analog-stereo"
+    assert sink["Description"] == "Built-in Audio Analog Stereo"
+    assert sink["Monitor Source"] == "alsa_output.pci-0000_00_1f.3.analog-stereo.monitor"
+    assert sink["balance"] == "0.00"
+    assert sink["properties"]["device.api"] == "alsa"
+    assert list(sink["ports"]) == ["analog-output-speaker", "analog-output-headphones"]
+    assert sink["Active Port"] == "analog-output-speaker"
+    assert sink["formats"] == ["pcm"]
+    assert devices[1]["properties"]["api.bluez5.codec"] == "sbc"
+
+def test_parse_pactl_list_localized_sections():
+    devices = parse_pactl_list(read_fixture("pactl_list_sources_es.txt"))
+    assert [device["id"] for device in devices] == ["1", "2"]
+    monitor, microphone = devices
+    assert get_device_name(monitor) == "alsa_output.pci-0000_00_1f.3.analog-stereo.monitor"
+    assert monitor["properties"]["device.class"] == "monitor"
+    assert "ports" not in monitor
+    assert microphone["Descripción"] == "Built-in Audio Analog Stereo"
+    assert list(microphone["ports"]) == ["analog-input-internal-mic", "analog-input-mic"]
+    assert microphone["formats"] == ["pcm"]
+
+def test_parse_pactl_json_matches_text_layout():
+    text_sinks = parse_pactl_list(read_fixture("pactl_list_sinks.txt"))
+    json_sinks = parse_pactl_json(read_fixture("pactl_list_sinks.json"))
+    for text_sink, json_sink in zip(text_sinks, json_sinks):
+        for key in ["id", "Name", "Description", "State", "Driver", "Monitor Source", "Active Port", "properties", "formats"]:
+            assert json_sink[key] == text_sink[key]
+        assert list(json_sink["ports"]) == list(text_sink["ports"])
+
+def test_parse_pactl_json_sources():
+    monitor, microphone = parse_pactl_json(read_fixture("pactl_list_sources.json"))
+    assert monitor["Monitor of Sink"] == "alsa_output.pci-0000_00_1f.3.analog-stereo"
+    assert "Active Port" not in monitor
+    assert get_device_name(microphone) == "alsa_input.pci-0000_00_1f.3.analog-stereo"
+    assert microphone["ports"]["analog-input-mic"] == "Microphone"
+
+class Fake_pactl:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, kind):
+        self.calls.append(kind)
+        return parse_pactl_json(read_fixture(f"pactl_list_{kind}.json"))
+
+def test_device_cache_runs_pactl_once():
+    run = Fake_pactl()
+    cache = Device_cache(run)
+    assert len(cache.get(SINKS)) == 2
+    assert len(cache.get(SINKS)) == 2
+    assert run.calls == [SINKS]
+
+def test_handle_event_remove_drops_device_without_pactl():
+    run = Fake_pactl()
+    cache = Device_cache(run)
+    cache.get(SINKS)
+    cache.handle_event("Event 'remove' on sink #3\n")
+    assert [device["id"] for device in cache.get(SINKS)] == ["0"]
+    assert run.calls == [SINKS]
+
+def test_handle_event_new_and_change_invalidate():
+    run = Fake_pactl()
+    cache = Device_cache(run)
+    cache.get(SINKS)
+    cache.get(SOURCES)
+    cache.handle_event("Event 'new' on source #7")
+    cache.get(SOURCES)
+    assert run.calls == [SINKS, SOURCES, SOURCES]
+    cache.handle_event("Event 'change' on sink #0")
+    cache.get(SINKS)
+    assert run.calls == [SINKS, SOURCES, SOURCES, SINKS]
+
+def test_handle_event_ignores_other_events():
+    run = Fake_pactl()
+    cache = Device_cache(run)
+    cache.get(SINKS)
+    for line in ["Event 'change' on sink-input #12", "Event 'new' on client #40", "Event 'change' on server", "garbage", ""]:
+        cache.handle_event(line)
+    cache.get(SINKS)
+    assert run.calls == [SINKS]
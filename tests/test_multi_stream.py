@@ -0,0 +1,23 @@
+import numpy as np
+from multi_stream import Multi_stream_translator, merge_stream_updates
+from stub_backends import Stub_transcriber, Stub_translator
+
+def test_output_prints_every_finished_line(capsys):
+    multi_stream = Multi_stream_translator(Stub_transcriber(), Stub_translator())
+    stream = multi_stream.add_stream("mic", use_vad=False, max_window_seconds=4)
+    chunk = (np.ones(2 * 16000, dtype=np.int16) * 1000).tobytes()
+    for _ in range(7):
+        stream.data_queue.put_item(chunk)
+    multi_stream.transcribe([0])
+    items = []
+    while not multi_stream.translation_queue.empty():
+        items.append(multi_stream.translation_queue.get_nowait())
+    multi_stream.output(multi_stream.translate(items))
+    printed = capsys.readouterr().out.splitlines()
+    assert len(stream.transcript.transcription) == 4
+    assert printed == [f"[mic] {line}\t\t{translation}" for line, translation in stream.transcript.lines()]
+
+def test_merge_stream_updates_keeps_finished_lines():
+    older = {0: (0, [("a", "A"), ("b", "B")]), 1: (3, [("x", "X")])}
+    newer = {0: (1, [("b.", "B."), ("c", "C")])}
+    assert merge_stream_updates(older, newer) == {0: (0, [("a", "A"), ("b.", "B."), ("c", "C")]), 1: (3, [("x", "X")])}
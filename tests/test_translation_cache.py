@@ -0,0 +1,23 @@
+import pytest
+from translation_cache import Translation_cache, normalize_text
+
+def test_normalize_text_collapses_whitespace_and_keeps_case():
+    assert normalize_text("  Hello \t world\n") == "Hello world"
+    assert normalize_text("Polish") != normalize_text("polish")
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = Translation_cache(path=path)
+    key = cache.make_key("Hello  world", "model")
+    cache.put(key, "Hola mundo")
+    cache.save()
+    loaded = Translation_cache(path=path)
+    assert loaded.get(loaded.make_key("Hello world", "model")) == "Hola mundo"
+
+@pytest.mark.parametrize("content", ['[["key", "value"', '{"key": "value"}', '[1, 2]', "\xff\xfe"])
+def test_corrupt_file_starts_empty(tmp_path, content):
+    path = tmp_path / "cache.json"
+    path.write_bytes(content.encode("latin-1"))
+    with pytest.warns(UserWarning):
+        cache = Translation_cache(path=str(path))
+    assert cache.stats()["entries"] == 0
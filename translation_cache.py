@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import warnings
+from collections import OrderedDict
+
+MAX_ENTRIES = 4096
+
+def normalize_text(text):
+    # Collapse whitespace so "Hello  world" and "Hello world" share an entry. Case is kept,
+    # it can change the translation, like "Polish" and "polish"
+    return " ".join(text.split())
+
+class Translation_cache:
+    def __init__(self, max_entries=MAX_ENTRIES, path=None):
+        self.max_entries = max_entries
+        self.path = path
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if self.path and os.path.exists(self.path):
+            self.load()
+
+    def make_key(self, text, model, system_prompt=""):
+        return json.dumps([model, system_prompt, normalize_text(text)], ensure_ascii=False)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            # Evict least recently used entries
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def load(self):
+        # A corrupt or unreadable cache is not worth failing the start, the session starts with an empty cache
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                entries = [(key, value) for key, value in json.load(file)]
+        except (ValueError, TypeError, OSError) as error:
+            warnings.warn(f"Can not load the translation cache {self.path}, starting with an empty cache: {error}")
+            return
+        with self.lock:
+            for key, value in entries:
+                self.entries[key] = value
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            entries = list(self.entries.items())
+        # Write to a temporary file and rename it so a crash never leaves a truncated cache
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+class Cached_translator:
+    def __init__(self, translator, cache=None):
+        self.translator = translator
+        self.cache = cache if cache is not None else Translation_cache()
+        self.model_name = getattr(translator, "checkpoints", None) or getattr(translator, "model", "")
+        system_prompt = getattr(translator, "sistem_prompt", None)
+        self.system_prompt = system_prompt["content"] if system_prompt else ""
+
+    def translate(self, text):
+        if not text.strip():
+            return ""
+        key = self.cache.make_key(text, self.model_name, self.system_prompt)
+        translation = self.cache.get(key)
+        if translation is None:
+            translation = self.translator.translate(text)
+            self.cache.put(key, translation)
+        return translation
+
+    def translate_stream(self, text):
+        # A hit is yielded at once, a miss is streamed from the translator and the whole translation is stored
+        if not text.strip():
+            return
+        key = self.cache.make_key(text, self.model_name, self.system_prompt)
+        translation = self.cache.get(key)
+        if translation is not None:
+            yield translation
+            return
+        if not hasattr(self.translator, "translate_stream"):
+            translation = self.translator.translate(text)
+            self.cache.put(key, translation)
+            yield translation
+            return
+        parts = []
+        for part in self.translator.translate_stream(text):
+            parts.append(part)
+            yield part
+        self.cache.put(key, "".join(parts).strip())
+
+    def translate_batch(self, texts):
+        translations = [""] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue
+            key = self.cache.make_key(text, self.model_name, self.system_prompt)
+            translation = self.cache.get(key)
+            if translation is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                translations[i] = translation
+        if pending:
+            # Only the cache misses go to the model, in one batched call
+            keys = list(pending)
+            results = self.translator.translate_batch([texts[pending[key][0]] for key in keys])
+            for key, translation in zip(keys, results):
+                self.cache.put(key, translation)
+                for i in pending[key]:
+                    translations[i] = translation
+        return translations
+
+    def translate_multi(self, text, languages):
+        if not text.strip():
+            return {language: "" for language in languages}
+        translations = {}
+        keys = {}
+        for language in languages:
+            # The language is part of the prompt, so it is part of the key
+            keys[language] = self.cache.make_key(text, self.model_name, f"{self.system_prompt}\n{language}")
+            translation = self.cache.get(keys[language])
+            if translation is not None:
+                translations[language] = translation
+        missing = [language for language in languages if language not in translations]
+        if missing:
+            for language, translation in self.translator.translate_multi(text, missing).items():
+                self.cache.put(keys[language], translation)
+                translations[language] = translation
+        return {language: translations[language] for language in languages}
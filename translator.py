@@ -1,29 +1,109 @@
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+from transformers import AutoTokenizer, AutoModelForCausalLM, DynamicCache, TextIteratorStreamer, pipeline
 import torch
+import copy
+import queue
+import threading
 # import accelerate
 from huggingface_hub import login
 from dotenv import load_dotenv
 import os
+from model_cache import get_model_dir, is_cached, is_offline, save_model_dir
+from languages import TARGET_LANGUAGE, LANGUAGE_PLACEHOLDER, SYSTEM_PROMPT, MULTI_TARGET_INSTRUCTION, get_language_name, get_multi_target_messages
 
 CHECKPOINTS = "Qwen/Qwen2.5-1.5B-Instruct"
+DRAFT_CHECKPOINTS = "Qwen/Qwen2.5-0.5B-Instruct" # Same tokenizer as the main model, usable as speculative decoding draft
+PROMPT_PLACEHOLDER = "<<prompt>>"
+MAX_NEW_TOKENS = 512
+MIN_NEW_TOKENS = 16
+OUTPUT_TOKENS_RATIO = 2.0 # Spanish translations are rarely more than twice as long as the English source
+STOP_STRINGS = ["\n"]
+STREAM_TIMEOUT_SECONDS = 60.0 # Longest wait for the next streamed token before generation is considered stuck
 
-class Translator:
-    def __init__(self):
-        load_dotenv()
-        hf_token = os.getenv('HF_TOKEN')
+def hub_login():
+    # Only needed to download the checkpoints, never in offline mode
+    load_dotenv()
+    hf_token = os.getenv('HF_TOKEN')
+    if hf_token and not is_offline():
         login(token=hf_token)
-        self.model = AutoModelForCausalLM.from_pretrained(
-            CHECKPOINTS,
-            torch_dtype="auto",
-            device_map="auto",
-        )
-        self.tokenizer = AutoTokenizer.from_pretrained(CHECKPOINTS)
+
+def load_model_and_tokenizer(checkpoints, device, use_model_cache=True):
+    # Half precision is slow on CPU, and dynamic quantization expects float32 weights
+    model_kwargs = {
+        "torch_dtype": "auto" if device != "cpu" else torch.float32,
+        "device_map": "auto" if device != "cpu" else "cpu",
+    }
+    model_dir = get_model_dir(checkpoints, "auto" if device != "cpu" else "float32")
+    if use_model_cache and is_cached(model_dir):
+        # Already converted safetensors, no hub access and the weights are memory mapped
+        model = AutoModelForCausalLM.from_pretrained(model_dir, local_files_only=True, **model_kwargs)
+        tokenizer = AutoTokenizer.from_pretrained(model_dir, padding_side="left", local_files_only=True)
+        return model, tokenizer
+    hub_login()
+    model = AutoModelForCausalLM.from_pretrained(checkpoints, **model_kwargs)
+    tokenizer = AutoTokenizer.from_pretrained(checkpoints, padding_side="left")
+    if use_model_cache:
+        def save(path):
+            model.save_pretrained(path, safe_serialization=True)
+            tokenizer.save_pretrained(path)
+        save_model_dir(model_dir, save)
+    return model, tokenizer
+
+class Translator:
+    def __init__(self, use_prefix_cache=True, device="auto", quantize=False, draft_checkpoints=None, greedy=False, use_model_cache=True, target_language=TARGET_LANGUAGE):
+        self.checkpoints = CHECKPOINTS
+        if device == "auto":
+            # Quantized models only run on CPU
+            device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+        self.device = device
+        self.use_model_cache = use_model_cache
+        self.model, self.tokenizer = load_model_and_tokenizer(CHECKPOINTS, self.device, use_model_cache)
+        # The cache keeps the float weights, int8 dynamic quantization is fast enough to run on every load
+        if quantize:
+            self.quantize()
+        if self.tokenizer.pad_token is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.target_language = target_language
         self.sistem_prompt = {
             "role": "system",
-            "content": "You are an expert translator, your mission is to translate texts from English to Spanish. You will receive texts in English, respond only with the Spanish translation, nothing else.",
+            "content": SYSTEM_PROMPT.replace(LANGUAGE_PLACEHOLDER, get_language_name(target_language)),
         }
+        self.use_prefix_cache = use_prefix_cache
+        if self.use_prefix_cache:
+            self.build_prefix_cache()
+        # The generation config of Qwen samples, greedy decoding gives always the same translation
+        self.greedy = greedy
+        self.draft_model = None
+        self.draft_tokenizer = None
+        self.use_draft = False
+        if draft_checkpoints:
+            self.load_draft_model(draft_checkpoints)
 
-    def translate(self, prompt):
+    def load_draft_model(self, draft_checkpoints):
+        # Speculative decoding: the small draft model proposes tokens and the main model verifies them,
+        # with greedy decoding the output is the same as the main model alone
+        self.draft_model, draft_tokenizer = load_model_and_tokenizer(draft_checkpoints, self.device, self.use_model_cache)
+        # Drafts with another vocabulary, like Llama 3.2 1B, need universal assisted decoding with both tokenizers
+        if draft_tokenizer.get_vocab() != self.tokenizer.get_vocab():
+            self.draft_tokenizer = draft_tokenizer
+        self.use_draft = True
+
+    def quantize(self):
+        # int8 dynamic quantization of the linear layers, only runs on CPU
+        if self.device != "cpu":
+            raise ValueError("Translator quantization is only supported on CPU")
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def build_prefix_cache(self):
+        # Everything in the chat before the user text is the same for every request,
+        # so its past key values are computed once and copied for each translation
+        tokenized_chat = self.get_chat(PROMPT_PLACEHOLDER)
+        self.prefix = tokenized_chat[:tokenized_chat.index(PROMPT_PLACEHOLDER)]
+        self.prefix_ids = self.tokenizer(self.prefix, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            outputs = self.model(self.prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        self.prefix_cache = outputs.past_key_values
+
+    def get_chat(self, prompt):
         messages = [
             self.sistem_prompt,
             {"role": "user", "content": prompt},
@@ -33,14 +113,140 @@ class Translator:
             tokenize=False,
             add_generation_prompt=True
         )
-        model_inputs = self.tokenizer([tokenized_chat], return_tensors="pt").to(self.model.device)
+        return tokenized_chat
+
+    def get_model_inputs(self, prompt):
+        tokenized_chat = self.get_chat(prompt)
+        # Assisted generation keeps its own caches for both models, the prefix cache is not used with it
+        if not self.use_prefix_cache or self.use_draft:
+            return self.tokenizer([tokenized_chat], return_tensors="pt").to(self.model.device), {}
+        # Tokenize only the part after the cached prefix and prepend the cached prefix ids
+        suffix = tokenized_chat[len(self.prefix):]
+        suffix_ids = self.tokenizer(suffix, return_tensors="pt", add_special_tokens=False).input_ids.to(self.model.device)
+        input_ids = torch.cat([self.prefix_ids, suffix_ids], dim=1)
+        model_inputs = {"input_ids": input_ids, "attention_mask": torch.ones_like(input_ids)}
+        return model_inputs, {"past_key_values": copy.deepcopy(self.prefix_cache)}
+
+    def get_max_new_tokens(self, prompts):
+        # Cap the output length by the input length so a run-on generation can not stall the loop
+        num_input_tokens = max(len(self.tokenizer(prompt, add_special_tokens=False).input_ids) for prompt in prompts)
+        return min(MAX_NEW_TOKENS, int(num_input_tokens * OUTPUT_TOKENS_RATIO) + MIN_NEW_TOKENS)
+
+    def get_generate_kwargs(self, prompts):
+        # Generation stops at EOS or at the first newline, a subtitle translation is a single line
+        generate_kwargs = {
+            "max_new_tokens": self.get_max_new_tokens(prompts),
+            "stop_strings": STOP_STRINGS,
+            "tokenizer": self.tokenizer,
+            "pad_token_id": self.tokenizer.pad_token_id,
+        }
+        if self.greedy:
+            generate_kwargs["do_sample"] = False
+        # Assisted generation only supports one sequence, batches are generated by the main model alone
+        if self.use_draft and len(prompts) == 1:
+            generate_kwargs["assistant_model"] = self.draft_model
+            generate_kwargs["do_sample"] = False
+            if self.draft_tokenizer is not None:
+                generate_kwargs["assistant_tokenizer"] = self.draft_tokenizer
+        return generate_kwargs
+
+    def translate(self, prompt):
+        model_inputs, cache_kwargs = self.get_model_inputs(prompt)
         generated_ids = self.model.generate(
             **model_inputs,
-            max_new_tokens=512
+            **cache_kwargs,
+            **self.get_generate_kwargs([prompt])
         )
         generated_ids = [
-            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs.input_ids, generated_ids)
+            output_ids[len(input_ids):] for input_ids, output_ids in zip(model_inputs["input_ids"], generated_ids)
         ]
         response = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)[0]
-        return response
-    
\ No newline at end of file
+        return response.strip()
+
+    def translate_stream(self, prompt):
+        # Yield the translated text as it is generated, generation runs in a background thread
+        model_inputs, cache_kwargs = self.get_model_inputs(prompt)
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=STREAM_TIMEOUT_SECONDS)
+        generate_kwargs = dict(
+            **model_inputs,
+            **cache_kwargs,
+            **self.get_generate_kwargs([prompt]),
+            streamer=streamer
+        )
+        errors = []
+        def generate():
+            # A failed generate never ends the streamer, it is ended here and the error raised in the caller
+            try:
+                self.model.generate(**generate_kwargs)
+            except Exception as error:
+                errors.append(error)
+                streamer.end()
+        thread = threading.Thread(target=generate, daemon=True)
+        thread.start()
+        try:
+            for text in streamer:
+                if text:
+                    yield text
+        except queue.Empty:
+            raise TimeoutError(f"No token generated in {STREAM_TIMEOUT_SECONDS} seconds")
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def translate_batch(self, prompts):
+        if not prompts:
+            return []
+        tokenized_chats = [self.get_chat(prompt) for prompt in prompts]
+        # Prompts are left padded so every generated sequence starts at the same position
+        model_inputs = self.tokenizer(tokenized_chats, return_tensors="pt", padding=True).to(self.model.device)
+        generated_ids = self.model.generate(
+            **model_inputs,
+            **self.get_generate_kwargs(prompts)
+        )
+        generated_ids = generated_ids[:, model_inputs.input_ids.shape[1]:]
+        responses = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+        return [response.strip() for response in responses]
+
+    def get_multi_target_chat(self, prompt, language):
+        messages = get_multi_target_messages(prompt, language)
+        return self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+
+    def translate_multi(self, prompt, languages):
+        # Translate one text to several languages with a single batched generate: the shared part of the chat
+        # is prefilled once and its past key values repeated for every language, only the short suffixes differ
+        if not languages:
+            return {}
+        tokenized_chat = self.get_multi_target_chat(prompt, LANGUAGE_PLACEHOLDER)
+        prefix = tokenized_chat[:tokenized_chat.rindex(MULTI_TARGET_INSTRUCTION.split(LANGUAGE_PLACEHOLDER)[0])]
+        suffixes = [tokenized_chat[len(prefix):].replace(LANGUAGE_PLACEHOLDER, get_language_name(language)) for language in languages]
+        prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            outputs = self.model(prefix_ids, past_key_values=DynamicCache(), use_cache=True)
+        prefix_cache = outputs.past_key_values
+        prefix_cache.batch_repeat_interleave(len(languages))
+
+        # Suffixes are padded between the prefix and the suffix, the attention mask hides the padding
+        # and the positions of the suffix tokens follow from the mask
+        suffix_ids = [self.tokenizer(suffix, add_special_tokens=False).input_ids for suffix in suffixes]
+        suffix_length = max(len(ids) for ids in suffix_ids)
+        padded_ids = [[self.tokenizer.pad_token_id] * (suffix_length - len(ids)) + ids for ids in suffix_ids]
+        padding_mask = [[0] * (suffix_length - len(ids)) + [1] * len(ids) for ids in suffix_ids]
+        num_prefix_tokens = prefix_ids.shape[1]
+        input_ids = torch.cat([prefix_ids.repeat(len(languages), 1), torch.tensor(padded_ids, device=self.model.device)], dim=1)
+        attention_mask = torch.cat([
+            torch.ones((len(languages), num_prefix_tokens), dtype=torch.long, device=self.model.device),
+            torch.tensor(padding_mask, dtype=torch.long, device=self.model.device),
+        ], dim=1)
+        # The prefix cache is passed to generate, so the draft model is not used even for a single language
+        generate_kwargs = self.get_generate_kwargs([prompt] * len(languages))
+        generate_kwargs.pop("assistant_model", None)
+        generate_kwargs.pop("assistant_tokenizer", None)
+        generated_ids = self.model.generate(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            past_key_values=prefix_cache,
+            **generate_kwargs
+        )
+        generated_ids = generated_ids[:, input_ids.shape[1]:]
+        responses = self.tokenizer.batch_decode(generated_ids, skip_special_tokens=True)
+        return {language: response.strip() for language, response in zip(languages, responses)}
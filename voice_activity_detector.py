@@ -0,0 +1,57 @@
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_MS = 30
+MIN_THRESHOLD_DB = -50 # Frames quieter than this are never speech
+NOISE_MARGIN_DB = 10 # Speech has to be this much louder than the estimated noise floor
+MIN_SILENCE_MS = 800 # Silence needed after speech to consider the utterance finished
+NOISE_FLOOR_FALL_ALPHA = 0.3 # The noise floor follows quieter frames quickly
+NOISE_FLOOR_RISE_DB = 1.0 # and rises at most this many dB per second, so a steady noise becomes the floor but speech does not
+
+class Voice_activity_detector:
+    def __init__(self, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS, min_threshold_db=MIN_THRESHOLD_DB,
+                 noise_margin_db=NOISE_MARGIN_DB, min_silence_ms=MIN_SILENCE_MS):
+        self.frame_length = int(sample_rate * frame_ms / 1000)
+        self.frame_ms = frame_ms
+        self.min_threshold_db = min_threshold_db
+        self.noise_margin_db = noise_margin_db
+        self.min_silence_ms = min_silence_ms
+        self.noise_floor_db = min_threshold_db
+        # The floor never goes further down than where it stops mattering, so it can rise again fast enough
+        self.min_noise_floor_db = min_threshold_db - noise_margin_db
+        self.noise_floor_rise_db = NOISE_FLOOR_RISE_DB * frame_ms / 1000
+        self.silence_ms = 0
+        self.in_utterance = False
+
+    def frame_energies_db(self, data):
+        samples = np.frombuffer(data, dtype=np.int16)
+        num_frames = len(samples) // self.frame_length
+        if num_frames == 0:
+            return np.empty(0, dtype=np.float32)
+        frames = samples[:num_frames * self.frame_length].reshape(num_frames, self.frame_length).astype(np.float32) / 32768.0
+        rms = np.sqrt(np.mean(frames ** 2, axis=1))
+        return 20 * np.log10(np.maximum(rms, 1e-10))
+
+    def process(self, data):
+        # Returns whether the chunk contains speech and whether an utterance finished inside it
+        has_speech = False
+        utterance_end = False
+        for energy_db in self.frame_energies_db(data):
+            threshold_db = max(self.min_threshold_db, self.noise_floor_db + self.noise_margin_db)
+            # Minimum tracker on every frame, fast down and slow up, a noise louder than the threshold
+            # would never be seen as silence and must become the floor anyway
+            if energy_db < self.noise_floor_db:
+                self.noise_floor_db += NOISE_FLOOR_FALL_ALPHA * (energy_db - self.noise_floor_db)
+            else:
+                self.noise_floor_db = min(energy_db, self.noise_floor_db + self.noise_floor_rise_db)
+            self.noise_floor_db = max(self.noise_floor_db, self.min_noise_floor_db)
+            if energy_db > threshold_db:
+                has_speech = True
+                self.in_utterance = True
+                self.silence_ms = 0
+            else:
+                self.silence_ms += self.frame_ms
+                if self.in_utterance and self.silence_ms >= self.min_silence_ms:
+                    self.in_utterance = False
+                    utterance_end = True
+        return has_speech, utterance_end
@@ -1,9 +1,64 @@
+import json
+import os
+from dataclasses import asdict
 import whisper
+import torch
+from safetensors import safe_open
+from safetensors.torch import save_file
+from model_cache import get_model_dir, is_cached, save_model_dir
+
+def load_whisper_model(model_size, device, use_model_cache=True):
+    # Official checkpoints are float16 pickles that whisper hashes and converts to float32 on every load,
+    # the cache keeps them already converted as safetensors. Custom checkpoint files are loaded as they are
+    if not use_model_cache or model_size not in whisper.available_models():
+        return whisper.load_model(model_size, device=device)
+    model_dir = get_model_dir(f"whisper-{model_size}", "float32")
+    if not is_cached(model_dir):
+        model = whisper.load_model(model_size, device=device)
+        def save(path):
+            with open(os.path.join(path, "dims.json"), "w") as file:
+                json.dump(asdict(model.dims), file)
+            save_file({name: tensor.contiguous().cpu() for name, tensor in model.state_dict().items()}, os.path.join(path, "model.safetensors"))
+        save_model_dir(model_dir, save)
+        return model
+    with open(os.path.join(model_dir, "dims.json")) as file:
+        dims = whisper.model.ModelDimensions(**json.load(file))
+    # The model is built on the CPU, its constructor makes a sparse tensor that can not be created on the meta device.
+    # assign=True makes the memory mapped tensors of the file the parameters instead of copying them into the
+    # initialized ones, so on CPU the weights stay in the page cache shared with every process that loads them
+    model = whisper.model.Whisper(dims)
+    with safe_open(os.path.join(model_dir, "model.safetensors"), framework="pt", device="cpu") as file:
+        state_dict = {name: file.get_tensor(name) for name in file.keys()}
+    model.load_state_dict(state_dict, assign=True)
+    alignment_heads = whisper._ALIGNMENT_HEADS.get(model_size)
+    if alignment_heads is not None:
+        model.set_alignment_heads(alignment_heads)
+    return model.to(device)
 
 class Whisper:
-    def __init__(self, model_size="tiny"):
+    def __init__(self, model_size="tiny", device="auto", quantize=False, use_model_cache=True):
         self.model_size = model_size
-        self.model = whisper.load_model(self.model_size)
+        if device == "auto":
+            # Quantized models only run on CPU
+            device = "cuda" if torch.cuda.is_available() and not quantize else "cpu"
+        self.device = device
+        self.model = load_whisper_model(self.model_size, self.device, use_model_cache)
+        if quantize:
+            self.quantize()
+
+    def quantize(self):
+        # int8 dynamic quantization only runs on CPU
+        if self.device != "cpu":
+            raise ValueError("Whisper quantization is only supported on CPU")
+        # Whisper uses a subclass of nn.Linear that quantize_dynamic does not recognize,
+        # it only casts the weights to the input dtype so it can be treated as a plain nn.Linear
+        for module in self.model.modules():
+            if isinstance(module, whisper.model.Linear):
+                module.__class__ = torch.nn.Linear
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
     
-    def transcribe(self, audio_np, fp16=False):
+    def transcribe(self, audio_np, fp16=None):
+        # By default use half precision only when the model runs on a GPU
+        if fp16 is None:
+            fp16 = self.model.device.type == "cuda"
         return self.model.transcribe(audio_np, fp16=fp16)
\ No newline at end of file